@@ -1,11 +1,10 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import sys
 import os
 import pandas as pd
 import sqlite3
 import base64
-from PIL import Image
-import io
 from datetime import datetime
 from streamlit_lottie import st_lottie
 import requests
@@ -19,18 +18,33 @@ from carzone.utils.db import (
     add_buyer_inquiry_new
 )
 from carzone.utils.otp_sender import send_otp, verify_otp
-from carzone.utils.dropdowns import (
-    models, locations, fuel_types, transmission_types,
-    ownership_types, variants, extra_features,
-    get_models_for_maker, get_cities_for_state
-)
 
 # Import estimation functionality
 from carzone.pages.Estimate import (
-    car_makes, locations as locations_estimate,
     transmission_types as transmission_types_estimate,
     calculate_depreciation, calculate_price
 )
+from carzone.utils import metrics
+from carzone.utils.otp_store import store as otp_store
+from carzone.utils.card_state import get_card_store
+from carzone.utils import snapshot
+from carzone.utils import image_server
+from carzone.utils import moderation
+from carzone.utils import archive
+from carzone.utils import saved_searches
+from carzone.utils import duplicates
+from carzone.utils.catalog import get_catalog
+from carzone.utils import shared_cache
+
+# Hot-path instrumentation (no-op unless TECHCAR_METRICS=1)
+get_db_connection = metrics.wrap_connection_factory(get_db_connection)
+# The Buy listing query reads the snapshot, so it is timed like live queries
+connect_snapshot = metrics.wrap_connection_factory(lambda: snapshot.connect(get_db_connection))
+calculate_price = metrics.timed("calculate_price")(shared_cache.memoize("estimate")(calculate_price))
+
+# Sell uploads are perceptually hashed and checked for re-listed photos; the
+# connection factory is looked up per call so the benchmarks can swap it
+add_car_image = duplicates.checking(add_car_image, lambda: get_db_connection())
 
 # Admin credentials
 ADMIN_USERNAME = "TechCar2Admin"
@@ -39,45 +53,23 @@ ADMIN_PASSWORD = "TechCar2Admin"
 # Transmission types for Estimate page
 transmission_types_estimate = ['Manual', 'Automatic', 'CVT', 'DCT', 'AMT']
 
-# Car makes and models with base prices for Estimate page
-car_makes_estimate = {
-    # (Include the car_makes dictionary from Estimate.py here)
-    # For brevity, only a few entries shown; full list should be included in actual code
-    'Maruti Suzuki': {
-        'Alto K10': 3.99,
-        'S-Presso': 4.25,
-        'Celerio': 5.25,
-        # ... add all models as in Estimate.py
-    },
-    'Hyundai': {
-        'Grand i10 Nios': 5.73,
-        'i20': 7.04,
-        # ... add all models as in Estimate.py
-    },
-    # Add other makes similarly...
-}
-
-# Locations with multipliers for Estimate page
-locations_estimate = {
-    # (Include the locations dictionary from Estimate.py here)
-    # For brevity, only a few entries shown; full list should be included in actual code
-    'Delhi NCR': {
-        'cities': ['New Delhi', 'Gurgaon', 'Noida', 'Faridabad', 'Ghaziabad'],
-        'multiplier': 1.0
-    },
-    'Maharashtra': {
-        'cities': ['Mumbai', 'Pune', 'Nagpur', 'Nashik'],
-        'multiplier': 1.08
-    },
-    # Add other states similarly...
-}
-
 # Helper functions for Admin page
-def display_image(image_data):
-    if image_data:
-        try:
-            image = Image.open(io.BytesIO(image_data))
+def show_car_image(image_id, width=640, signed=False):
+    # Link to the image endpoint when browsers can reach it; otherwise send
+    # the (cached, resized) bytes inline
+    if image_server.serves_urls(signed):
+        st.image(image_server.image_url(image_id, width=width, signed=signed), use_column_width=True)
+    else:
+        image = image_server.load(get_db_connection, image_id, width=width, signed=signed)
+        if image:
             st.image(image, use_column_width=True)
+
+@metrics.timed("display_image")
+def display_image(image_id):
+    # Pending cars are not public, so admin URLs carry a signature
+    if image_id:
+        try:
+            show_car_image(image_id, signed=True)
         except Exception as e:
             st.error(f"Error displaying image: {str(e)}")
 
@@ -104,6 +96,205 @@ def admin_login():
         else:
             st.error("Invalid credentials")
 
+def get_admin_counts(cursor):
+    pending_cars_count = cursor.execute(
+        "SELECT COUNT(*) FROM cars WHERE status IS NULL OR status NOT IN ('approved', 'rejected')"
+    ).fetchone()[0]
+    new_inquiries_count = cursor.execute(
+        "SELECT COUNT(*) FROM buyer_inquiries WHERE status IS NULL OR status != 'contacted'"
+    ).fetchone()[0]
+    return pending_cars_count, new_inquiries_count
+
+def get_pending_cars(cursor):
+    cursor.execute("""
+        SELECT 
+            c.*,
+            s.email as seller_email,
+            s.phone as seller_phone,
+            s.state as seller_state,
+            s.city as seller_city,
+            s.created_at as seller_created_at
+        FROM cars c
+        JOIN sellers s ON c.seller_id = s.id
+        WHERE c.status IS NULL OR c.status NOT IN ('approved', 'rejected')
+        ORDER BY c.created_at DESC
+    """)
+    return cursor.fetchall()
+
+def get_car_images(cursor, car_id):
+    cursor.execute("SELECT id FROM car_images WHERE car_id = ? ORDER BY id", (car_id,))
+    return cursor.fetchall()
+
+def get_car_document(cursor, car_id, document_type):
+    cursor.execute("SELECT document_data FROM documents WHERE car_id = ? AND document_type = ?", (car_id, document_type))
+    return cursor.fetchone()
+
+def set_car_status(conn, car_ids, status):
+    updated = moderation.apply_decisions(conn, car_ids, status)
+    if updated and status == 'approved':
+        snapshot.invalidate(get_db_connection)
+        saved_searches.notify_matches(get_db_connection, car_ids)
+    return updated
+
+def render_car_review(cursor, car):
+    st.subheader("Car Details")
+    st.write(f"**Car:** {car['maker']} {car['model']}")
+    st.write(f"**Year:** {car['year']}")
+    st.write(f"**Price:** ₹{car['price']:,}")
+    st.write(f"**Seller Email:** {car['seller_email']}")
+    st.write(f"**Seller Phone:** {car['seller_phone']}")
+    st.write(f"**Seller State:** {car['seller_state']}")
+    st.write(f"**Seller City:** {car['seller_city']}")
+    st.write(f"**Listed on:** {car['seller_created_at']}")
+
+    for matched_car_id, distance, matched_status in duplicates.flags_for(cursor, [car['id']]).get(car['id'], []):
+        st.warning(
+            f"⚠️ Photos closely match car listing #{matched_car_id} ({matched_status}, hash distance {distance}). "
+            "Check whether this car was listed before."
+        )
+
+    st.subheader("Car Images")
+    images = get_car_images(cursor, car['id'])
+    if images:
+        cols = st.columns(min(4, len(images)))
+        for idx, image in enumerate(images):
+            with cols[idx % 4]:
+                display_image(image['id'])
+    else:
+        st.info("No images uploaded")
+
+    st.subheader("Documents")
+    col1, col2 = st.columns(2)
+    with col1:
+        rc_book = get_car_document(cursor, car['id'], 'rc_book')
+        if rc_book:
+            display_pdf(rc_book['document_data'], f"RC_Book_{car['id']}.pdf")
+        else:
+            st.info("RC Book not uploaded")
+    with col2:
+        insurance = get_car_document(cursor, car['id'], 'insurance')
+        if insurance:
+            display_pdf(insurance['document_data'], f"Insurance_{car['id']}.pdf")
+        else:
+            st.info("Insurance document not uploaded")
+
+def bulk_decide(status, car_ids):
+    # Runs as a button callback, before the rerun, so one click costs one rerun
+    conn = get_db_connection()
+    updated = set_car_status(conn, car_ids, status)
+    conn.close()
+    st.session_state.moderation_selected = []
+    st.session_state.moderation_select_all = False
+    st.session_state.review_queue = None
+    st.session_state.moderation_notice = f"{updated} car listing(s) {status}."
+
+def admin_moderation_queue(cursor):
+    cars = get_pending_cars(cursor)
+    if not cars:
+        st.info("No car listings found.")
+        return
+    flags = duplicates.flags_for(cursor, [car['id'] for car in cars])
+    # Queue view shows row data only; media is loaded in Next Pending review
+    st.dataframe(pd.DataFrame([
+        {
+            "ID": car['id'],
+            "Car": f"{car['maker']} {car['model']}",
+            "Year": car['year'],
+            "Price (₹)": car['price'],
+            "Location": f"{car['city']}, {car['state']}",
+            "Seller Email": car['seller_email'],
+            "Listed on": car['created_at'],
+            "Possible Duplicate Of": ", ".join(f"#{match[0]}" for match in flags.get(car['id'], []))
+        }
+        for car in cars
+    ]), hide_index=True, use_container_width=True)
+
+    labels = {car['id']: f"#{car['id']} {car['maker']} {car['model']} - ₹{car['price']:,}" for car in cars}
+    select_all = st.checkbox(f"Select all {len(cars)} pending listings", key="moderation_select_all")
+    if select_all:
+        selected = list(labels)
+    else:
+        selected = st.multiselect("Select listings", list(labels), format_func=labels.get, key="moderation_selected")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button(
+            f"Approve {len(selected)} Selected", key="bulk_approve", disabled=not selected,
+            on_click=bulk_decide, args=('approved', selected), help="Approve all selected listings"
+        )
+    with col2:
+        st.button(
+            f"Reject {len(selected)} Selected", key="bulk_reject", disabled=not selected,
+            on_click=bulk_decide, args=('rejected', selected), help="Reject all selected listings"
+        )
+
+REVIEW_SHORTCUTS = """
+<script>
+const doc = window.parent.document;
+if (!doc.techcarReviewShortcuts) {
+    doc.techcarReviewShortcuts = true;
+    doc.addEventListener('keydown', (event) => {
+        if (['INPUT', 'TEXTAREA', 'SELECT'].includes(event.target.tagName)) return;
+        const label = {a: 'Approve (A)', r: 'Reject (R)', s: 'Skip (S)'}[event.key.toLowerCase()];
+        if (!label) return;
+        const button = Array.from(doc.querySelectorAll('button')).find((b) => b.innerText.trim() === label);
+        if (button) button.click();
+    });
+}
+</script>
+"""
+
+def review_decide(car_id, status):
+    queue = st.session_state.review_queue
+    if car_id in queue:
+        queue.remove(car_id)
+    if status is None:
+        queue.append(car_id)
+        return
+    conn = get_db_connection()
+    updated = set_car_status(conn, [car_id], status)
+    conn.close()
+    if updated:
+        st.session_state.moderation_notice = f"Car listing #{car_id} {status}."
+
+def admin_review_next(cursor):
+    if st.button("Refresh Queue", key="review_refresh") or st.session_state.get('review_queue') is None:
+        st.session_state.review_queue = moderation.pending_ids(cursor)
+    queue = st.session_state.review_queue
+
+    # Drop cars another admin decided since the queue was loaded
+    car = None
+    while queue and car is None:
+        car = moderation.get_review_car(cursor, queue[0])
+        if car is None:
+            queue.pop(0)
+    if car is None:
+        st.info("No car listings found.")
+        return
+
+    st.caption(f"{len(queue)} listing(s) left in this queue. Keys: A approve, R reject, S skip.")
+    render_car_review(cursor, car)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.button("Approve (A)", key="review_approve", on_click=review_decide, args=(car['id'], 'approved'))
+    with col2:
+        st.button("Reject (R)", key="review_reject", on_click=review_decide, args=(car['id'], 'rejected'))
+    with col3:
+        st.button("Skip (S)", key="review_skip", on_click=review_decide, args=(car['id'], None))
+
+    # Warm the browser cache with the next car's images, or the server-side
+    # cache when images are sent inline
+    if len(queue) > 1:
+        next_images = get_car_images(cursor, queue[1])
+        if image_server.serves_urls(signed=True):
+            prefetch = "".join(
+                f"<img src='{image_server.image_url(image['id'], width=640, signed=True)}' style='display:none' alt=''>"
+                for image in next_images
+            )
+            st.markdown(prefetch, unsafe_allow_html=True)
+        else:
+            image_server.warm(get_db_connection, [image['id'] for image in next_images], width=640, signed=True)
+    components.html(REVIEW_SHORTCUTS, height=0)
+
 def admin_panel():
     # Only show the main admin header/card after successful login
     if 'admin_logged_in' not in st.session_state:
@@ -122,13 +313,7 @@ def admin_panel():
     # Get actual counts from the database
     conn = get_db_connection()
     cursor = conn.cursor()
-    pending_cars_count = cursor.execute(
-        "SELECT COUNT(*) FROM cars WHERE status IS NULL OR status NOT IN ('approved', 'rejected')"
-    ).fetchone()[0]
-
-    new_inquiries_count = cursor.execute(
-        "SELECT COUNT(*) FROM buyer_inquiries WHERE status IS NULL OR status != 'contacted'"
-    ).fetchone()[0]
+    pending_cars_count, new_inquiries_count = get_admin_counts(cursor)
 
     # Dashboard summary (now dynamic)
     st.markdown(f"""
@@ -146,82 +331,24 @@ def admin_panel():
         </div>
     """, unsafe_allow_html=True)
 
-    page = st.radio("Select Section", ["Car Listings", "Buyer Inquiries"], horizontal=True)
+    sections = ["Car Listings", "Buyer Inquiries", "Archive"]
+    if metrics.ENABLED:
+        sections.append("Metrics")
+    page = st.radio("Select Section", sections, horizontal=True)
     conn = get_db_connection()
     cursor = conn.cursor()
 
     if page == "Car Listings":
         st.markdown("<div class='admin-card'>", unsafe_allow_html=True)
         st.header("Car Listings")
-        cursor.execute("""
-            SELECT 
-                c.*,
-                s.email as seller_email,
-                s.phone as seller_phone,
-                s.state as seller_state,
-                s.city as seller_city,
-                s.created_at as seller_created_at
-            FROM cars c
-            JOIN sellers s ON c.seller_id = s.id
-            WHERE c.status IS NULL OR c.status NOT IN ('approved', 'rejected')
-            ORDER BY c.created_at DESC
-        """)
-        cars = cursor.fetchall()
-        if not cars:
-            st.info("No car listings found.")
-            st.markdown("</div>", unsafe_allow_html=True)
-            return
-        for car in cars:
-            with st.expander(f"{car['maker']} {car['model']} - ₹{car['price']:,}"):
-                st.markdown("<div class='admin-card' style='background:linear-gradient(120deg,#181818 0%,#232526 100%);'>", unsafe_allow_html=True)
-                st.subheader("Car Details")
-                st.write(f"**Year:** {car['year']}")
-                st.write(f"**Price:** ₹{car['price']:,}")
-                st.write(f"**Seller Email:** {car['seller_email']}")
-                st.write(f"**Seller Phone:** {car['seller_phone']}")
-                st.write(f"**Seller State:** {car['seller_state']}")
-                st.write(f"**Seller City:** {car['seller_city']}")
-                st.write(f"**Listed on:** {car['seller_created_at']}")
-
-                st.subheader("Car Images")
-                cursor.execute("SELECT image_data FROM car_images WHERE car_id = ?", (car['id'],))
-                images = cursor.fetchall()
-                if images:
-                    cols = st.columns(min(4, len(images)))
-                    for idx, image in enumerate(images):
-                        with cols[idx % 4]:
-                            display_image(image['image_data'])
-                else:
-                    st.info("No images uploaded")
-
-                st.subheader("Documents")
-                col1, col2 = st.columns(2)
-                with col1:
-                    cursor.execute("SELECT document_data FROM documents WHERE car_id = ? AND document_type = 'rc_book'", (car['id'],))
-                    rc_book = cursor.fetchone()
-                    if rc_book:
-                        display_pdf(rc_book['document_data'], f"RC_Book_{car['id']}.pdf")
-                    else:
-                        st.info("RC Book not uploaded")
-                with col2:
-                    cursor.execute("SELECT document_data FROM documents WHERE car_id = ? AND document_type = 'insurance'", (car['id'],))
-                    insurance = cursor.fetchone()
-                    if insurance:
-                        display_pdf(insurance['document_data'], f"Insurance_{car['id']}.pdf")
-                    else:
-                        st.info("Insurance document not uploaded")
-
-                if st.button("Approve", key=f"approve_{car['id']}", help="Approve this car listing"):
-                    cursor.execute("UPDATE cars SET status = 'approved' WHERE id = ?", (car['id'],))
-                    conn.commit()
-                    st.success("Car listing approved!")
-                    st.experimental_rerun()
-                if st.button("Reject", key=f"reject_{car['id']}", help="Reject this car listing"):
-                    cursor.execute("UPDATE cars SET status = 'rejected' WHERE id = ?", (car['id'],))
-                    conn.commit()
-                    st.success("Car listing rejected!")
-                    st.experimental_rerun()
-                st.markdown("</div>", unsafe_allow_html=True)
+        if 'moderation_notice' in st.session_state:
+            st.success(st.session_state.pop('moderation_notice'))
+        mode = st.radio("Review Mode", ["Queue", "Next Pending"], horizontal=True, key="moderation_mode")
+        if mode == "Queue":
+            admin_moderation_queue(cursor)
+        else:
+            admin_review_next(cursor)
+        st.markdown("</div>", unsafe_allow_html=True)
 
     elif page == "Buyer Inquiries":
         st.markdown("<div class='admin-card'>", unsafe_allow_html=True)
@@ -260,21 +387,170 @@ def admin_panel():
                 st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
+    elif page == "Archive":
+        admin_archive(cursor)
+
+    elif page == "Metrics":
+        admin_metrics()
+
+def admin_archive(cursor):
+    st.markdown("<div class='admin-card'>", unsafe_allow_html=True)
+    st.header("Archive")
+    st.write(
+        f"Listings rejected more than {archive.REJECTED_AFTER_DAYS} days ago and contacted inquiries older than "
+        f"{archive.INQUIRY_AFTER_DAYS} days are moved to the archive automatically."
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        car_id = st.number_input("Car ID", min_value=0, value=0, step=1, key="archive_car_id")
+    with col2:
+        email = st.text_input("Seller or Buyer Email", key="archive_email")
+    if st.button("Search Archive", key="archive_search"):
+        seller_ids = []
+        if email:
+            cursor.execute("SELECT id FROM sellers WHERE email = ?", (email,))
+            seller_ids = [row['id'] for row in cursor.fetchall()]
+        cars = archive.find_cars(get_db_connection, car_id=car_id or None, seller_ids=seller_ids)
+        inquiries = archive.find_inquiries(get_db_connection, email=email or None, car_id=car_id or None)
+        if not cars and not inquiries:
+            st.info("Nothing found in the archive.")
+        for car in cars:
+            with st.expander(f"#{car['id']} {car['maker']} {car['model']} - {car['status']} ({car['archive']})"):
+                st.write(f"**Year:** {car['year']}")
+                st.write(f"**Price:** ₹{car['price']:,}")
+                st.write(f"**Location:** {car['city']}, {car['state']}")
+                st.write(f"**Listed on:** {car['created_at']}")
+                if car['images']:
+                    cols = st.columns(min(4, len(car['images'])))
+                    for idx, image_data in enumerate(car['images']):
+                        with cols[idx % 4]:
+                            st.image(image_data, use_column_width=True)
+                for document_type, document_data in car['documents'].items():
+                    display_pdf(document_data, f"{document_type}_{car['id']}.pdf")
+        for inquiry in inquiries:
+            with st.expander(f"Inquiry #{inquiry['id']} for car #{inquiry['car_id']} - {inquiry['created_at']} ({inquiry['archive']})"):
+                st.write(f"**Buyer Name:** {inquiry['name']}")
+                st.write(f"**Buyer Email:** {inquiry['email']}")
+                st.write(f"**Buyer Phone:** {inquiry['phone']}")
+                st.write(f"**Message:** {inquiry['message']}")
+                st.write(f"**Status:** {inquiry['status']}")
+    if st.button("Run Archival Now", key="archive_run", help="Archive cold rows immediately"):
+        moved = archive.run_now(get_db_connection)
+        if moved is None:
+            st.info("An archival pass is already running. Try again shortly.")
+        else:
+            st.success(f"Archived {moved[0]} rejected car(s) and {moved[1]} inquiry(ies).")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+def admin_metrics():
+    st.markdown("<div class='admin-card'>", unsafe_allow_html=True)
+    st.header("Performance Metrics")
+    totals, reruns, slow_queries = metrics.snapshot()
+    if not totals:
+        st.info("No metrics recorded yet.")
+    else:
+        st.subheader("Hot paths")
+        st.dataframe(pd.DataFrame.from_dict(totals, orient="index").sort_values("total_ms", ascending=False))
+    if reruns:
+        st.subheader("Recent reruns")
+        st.dataframe(pd.DataFrame([
+            {
+                "at": r["at"],
+                "page": r["page"],
+                "ms": r["ms"],
+                "sql_ms": sum(v["ms"] for k, v in r["spans"].items() if k.startswith("sql.")),
+                "rows": sum(v["rows"] for v in r["spans"].values()),
+                "bytes": sum(v["bytes"] for v in r["spans"].values())
+            }
+            for r in reversed(reruns)
+        ]))
+    st.subheader(f"Slow queries (>= {metrics.SLOW_QUERY_MS:g} ms)")
+    if not slow_queries:
+        st.info("No slow queries logged.")
+    for query in reversed(slow_queries):
+        with st.expander(f"{query['ms']} ms - {query['at']}"):
+            st.code(query['sql'], language="sql")
+            st.write(f"**Params:** {query['params']}")
+            if query['plan']:
+                st.code("\n".join(query['plan']))
+    st.download_button(
+        label="Download Prometheus metrics",
+        data=metrics.prometheus_text(),
+        file_name="techcar_metrics.prom",
+        mime="text/plain"
+    )
+    st.markdown("</div>", unsafe_allow_html=True)
+
+def describe_filters(filters):
+    parts = [filters[key] for key in saved_searches.EQ_ATTRIBUTES if filters.get(key)]
+    if filters.get('min_price'):
+        parts.append(f"from ₹{filters['min_price']:,}")
+    if filters.get('max_price'):
+        parts.append(f"up to ₹{filters['max_price']:,}")
+    return ", ".join(parts) or "All cars"
+
+def saved_search_panel(filters):
+    with st.expander("🔔 Saved Searches"):
+        email = st.text_input("Your email address", key="saved_search_email")
+        # Saved searches are only shown or changed for an email verified in this session
+        verified = bool(email) and st.session_state.get('saved_search_verified') == email.strip().lower()
+        if not verified:
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Send OTP", key="send_otp_saved_search"):
+                    if email:
+                        success, message = otp_store.send(email, send_otp)
+                        if success:
+                            st.success(message)
+                            st.session_state.saved_search_otp_email = email
+                        else:
+                            st.error(message)
+                    else:
+                        st.error("Please enter your email address")
+            with col2:
+                otp_input = st.text_input("Enter OTP", key="saved_search_otp")
+                if st.button("Verify OTP", key="verify_otp_saved_search"):
+                    otp_email = st.session_state.get('saved_search_otp_email')
+                    if otp_input and otp_email:
+                        success, message = otp_store.verify(otp_email, otp_input, verify_otp)
+                        if success:
+                            st.session_state.saved_search_verified = otp_email.strip().lower()
+                            st.experimental_rerun()
+                        else:
+                            st.error(message)
+                    else:
+                        st.error("Please enter both email and OTP")
+            return
+        if st.button("Save This Search", key="save_search"):
+            saved_searches.save(get_db_connection, email, filters)
+            st.success("Search saved. New matching cars will appear here once approved.")
+        matches = saved_searches.unseen_matches(get_db_connection, email)
+        if matches:
+            st.markdown(f"**{len(matches)} new car(s) match your saved searches:**")
+            for car_id, maker, model, year, price, city, state in matches:
+                st.write(f"{year} {maker} {model} - ₹{price:,} ({city}, {state})")
+            if st.button("Mark All as Seen", key="saved_search_seen"):
+                saved_searches.mark_seen(get_db_connection, email)
+                st.experimental_rerun()
+        for search_id, saved_filters, unseen in saved_searches.list_for(get_db_connection, email):
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.write(f"{describe_filters(saved_filters)} ({unseen} new)")
+            with col2:
+                if st.button("Delete", key=f"delete_search_{search_id}"):
+                    saved_searches.delete(get_db_connection, email, search_id)
+                    st.experimental_rerun()
+
+@metrics.timed("get_car_listings")
 def get_car_listings(filters=None):
-    conn = get_db_connection()
+    # Served from the read-only snapshot of approved cars; cards load their
+    # images from the image endpoint by id.
+    conn = connect_snapshot()
     cursor = conn.cursor()
     query = """
-        SELECT 
-            c.*,
-            s.email as seller_email,
-            s.phone as seller_phone,
-            s.state as seller_state,
-            s.city as seller_city,
-            ci.image_data as image_data
-        FROM cars c
-        JOIN sellers s ON c.seller_id = s.id
-        LEFT JOIN car_images ci ON c.id = ci.car_id
-        WHERE c.status = 'approved'
+        SELECT c.*
+        FROM listings c
+        WHERE 1 = 1
     """
     params = []
     if filters:
@@ -306,21 +582,41 @@ def get_car_listings(filters=None):
         if conditions:
             query += " AND " + " AND ".join(conditions)
     query += " ORDER BY c.created_at DESC"
+    # Results are shared across workers for as long as the snapshot's
+    # generation is current
+    generation = snapshot.generation(conn)
+    if generation is not None:
+        cached = shared_cache.get("listings", (query, tuple(params)), generation)
+        if cached is not shared_cache.MISS:
+            conn.close()
+            return cached
     cursor.execute(query, params)
-    cars = cursor.fetchall()
-    car_dict = {}
-    for car in cars:
-        car_id = car['id']
-        if car_id not in car_dict:
-            car_dict[car_id] = dict(car)
-            car_dict[car_id]['images'] = []
-        if car['image_data']:
-            car_dict[car_id]['images'].append(car['image_data'])
+    cars = []
+    for row in cursor.fetchall():
+        car = dict(row)
+        car['image_ids'] = [int(i) for i in car['image_ids'].split(',')] if car['image_ids'] else []
+        cars.append(car)
     conn.close()
-    return list(car_dict.values())
+    if generation is not None:
+        shared_cache.put("listings", (query, tuple(params)), cars, generation)
+    return cars
 
 def main():
+    rerun = metrics.start_rerun()
+    try:
+        render_page()
+    finally:
+        # Reruns cut short by st.experimental_rerun(), st.stop() or an error
+        # are recorded too
+        metrics.finish_rerun(rerun, st.session_state.get("nav_page", "Home"))
+
+def render_page():
     st.set_page_config(page_title="TechCar2 - Used Car Hub", page_icon="🚗", layout="wide")
+    shared_cache.install(get_db_connection)
+    image_server.start(get_db_connection)
+    # Moves cold rows out of the live tables at most once per interval
+    archive.start(get_db_connection)
+    catalog = get_catalog()
 
     st.markdown("""
         <style>
@@ -528,24 +824,24 @@ def main():
 
             with col1:
                 st.markdown("### 🚗 Car Details")
-                maker = st.selectbox("Car Maker", [""] + list(models.keys()))
+                maker = st.selectbox("Car Maker", ("",) + catalog.makers)
                 if maker:
-                    model = st.selectbox("Car Model", [""] + get_models_for_maker(maker))
+                    model = st.selectbox("Car Model", ("",) + catalog.models_for(maker))
                 else:
                     model = ""
-                fuel_type = st.selectbox("Fuel Type", [""] + fuel_types)
+                fuel_type = st.selectbox("Fuel Type", ("",) + catalog.fuel_types)
 
             with col2:
                 st.markdown("### 💰 Price Range")
                 min_price = st.number_input("Min Price (₹)", min_value=0, value=0, step=100000)
                 max_price = st.number_input("Max Price (₹)", min_value=0, value=10000000, step=100000)
-                transmission = st.selectbox("Transmission", [""] + transmission_types)
+                transmission = st.selectbox("Transmission", ("",) + catalog.transmission_types)
 
             with col3:
                 st.markdown("### 📍 Location")
-                state = st.selectbox("State", [""] + list(locations.keys()))
+                state = st.selectbox("State", ("",) + catalog.states)
                 if state:
-                    city = st.selectbox("City", [""] + get_cities_for_state(state))
+                    city = st.selectbox("City", ("",) + catalog.cities_for(state))
                 else:
                     city = ""
 
@@ -560,10 +856,16 @@ def main():
             'state': state if state else None,
             'city': city if city else None
         }
+        saved_search_panel(filters)
 
         # Get and display car listings
         cars = get_car_listings(filters)
 
+        # Per-card UI state lives in one bounded store; cards that dropped
+        # out of the results lose their state.
+        card_states = get_card_store(st.session_state)
+        card_states.retain(car['id'] for car in cars)
+
         if not cars:
             st.info("No cars found matching your criteria.")
         else:
@@ -572,30 +874,21 @@ def main():
             card_cols = st.columns(min(len(cars), 4))  # Show up to 4 cards per row
             for idx, car in enumerate(cars):
                 with card_cols[idx % 4]:
-                    img_key = f"img_idx_{car['id']}"
-                    details_key = f"details_{car['id']}"
-                    contact_key = f"contact_{car['id']}"
-                    if img_key not in st.session_state:
-                        st.session_state[img_key] = 0
-                    if details_key not in st.session_state:
-                        st.session_state[details_key] = False
-                    if contact_key not in st.session_state:
-                        st.session_state[contact_key] = False
+                    card = card_states.get(car['id'])
 
                     st.markdown("<div style='background: #232323; border-radius: 12px; padding: 18px; margin-bottom: 18px; box-shadow: 0 2px 8px rgba(0,0,0,0.15);'>", unsafe_allow_html=True)
 
-                    images = car.get('images', [])
+                    images = car.get('image_ids', [])
                     if images:
-                        img_idx = st.session_state[img_key]
-                        img = images[img_idx]
-                        st.image(Image.open(io.BytesIO(img)), use_column_width=True)
+                        img_idx = card.img_idx % len(images)
+                        show_car_image(images[img_idx])
                         col_img1, col_img2, col_img3 = st.columns([1,2,1])
                         with col_img1:
                             if st.button("❮", key=f"prev_{car['id']}"):
-                                st.session_state[img_key] = (img_idx - 1) % len(images)
+                                card_states.update(car['id'], img_idx=(img_idx - 1) % len(images))
                         with col_img3:
                             if st.button("❯", key=f"next_{car['id']}"):
-                                st.session_state[img_key] = (img_idx + 1) % len(images)
+                                card_states.update(car['id'], img_idx=(img_idx + 1) % len(images))
                     else:
                         st.image("https://via.placeholder.com/350x200?text=No+Image", use_column_width=True)
 
@@ -610,9 +903,10 @@ def main():
                         </div>
                     """, unsafe_allow_html=True)
 
-                    if st.button("Show Less" if st.session_state[details_key] else "More Details", key=f"details_btn_{car['id']}"):
-                        st.session_state[details_key] = not st.session_state[details_key]
-                    if st.session_state[details_key]:
+                    if st.button("Show Less" if card.details else "More Details", key=f"details_btn_{car['id']}"):
+                        card_states.update(car['id'], details=not card.details)
+                        card = card_states.get(car['id'])
+                    if card.details:
                         st.markdown("<div style='background:#181818;padding:10px 12px;border-radius:8px;margin:10px 0;color:#eee;'>", unsafe_allow_html=True)
                         st.write(f"**Variant:** {car['variant']}")
                         st.write(f"**Ownership:** {car['ownership']}")
@@ -624,25 +918,27 @@ def main():
                         st.markdown("</div>", unsafe_allow_html=True)
 
                     if st.button("Contact Seller", key=f"contact_btn_{car['id']}"):
-                        st.session_state[contact_key] = True
-                    if st.session_state[contact_key]:
+                        card_states.update(car['id'], contact=True)
+                        card = card_states.get(car['id'])
+                    if card.contact:
                         st.markdown("<div style='background:#181818;padding:16px 12px;border-radius:8px;margin:10px 0;color:#eee;'>", unsafe_allow_html=True)
                         st.write("**Contact Seller**")
                         email = st.text_input("Enter your email address", key=f"email_{car['id']}")
                         if st.button("Send OTP", key=f"send_otp_{car['id']}"):
                             if email:
-                                success, message = send_otp(email)
+                                success, message = otp_store.send(email, send_otp)
                                 if success:
                                     st.success(message)
-                                    st.session_state[f"otp_email_{car['id']}"] = email
+                                    card_states.update(car['id'], otp_email=email)
                                 else:
                                     st.error(message)
                             else:
                                 st.error("Please enter your email address")
                         otp_input = st.text_input("Enter OTP", key=f"otp_{car['id']}")
                         if st.button("Verify OTP", key=f"verify_otp_{car['id']}"):
-                            if otp_input and st.session_state.get(f"otp_email_{car['id']}"):
-                                success, message = verify_otp(st.session_state[f"otp_email_{car['id']}"] , otp_input)
+                            otp_email = card_states.get(car['id']).otp_email
+                            if otp_input and otp_email:
+                                success, message = otp_store.verify(otp_email, otp_input, verify_otp)
                                 if success:
                                     st.success(message)
                                     st.write(f"Seller's Phone: **{car['seller_phone']}**")
@@ -651,7 +947,7 @@ def main():
                             else:
                                 st.error("Please enter both email and OTP")
                         if st.button("Close", key=f"close_contact_{car['id']}"):
-                            st.session_state[contact_key] = False
+                            card_states.update(car['id'], contact=False, otp_email=None)
                         st.markdown("</div>", unsafe_allow_html=True)
 
                     st.markdown("</div>", unsafe_allow_html=True)
@@ -773,7 +1069,7 @@ def main():
             with col1:
                 if st.button("Send OTP", key="send_otp_sell_btn", help="Send OTP to your email"):
                     if email:
-                        success, message = send_otp(email)
+                        success, message = otp_store.send(email, send_otp)
                         if success:
                             st.success(message)
                             st.session_state.email_sell = email
@@ -785,7 +1081,7 @@ def main():
                 otp_input = st.text_input("Enter OTP", key="sell_otp_input")
                 if st.button("Verify OTP", key="verify_otp_sell_btn", help="Verify the OTP sent to your email"):
                     if otp_input and st.session_state.email_sell:
-                        success, message = verify_otp(st.session_state.email_sell, otp_input)
+                        success, message = otp_store.verify(st.session_state.email_sell, otp_input, verify_otp)
                         if success:
                             st.success(message)
                             st.session_state.otp_verified_sell = True
@@ -802,19 +1098,19 @@ def main():
             with st.form("car_details_form"):
                 col1, col2 = st.columns(2)
                 with col1:
-                    maker = st.selectbox("Car Maker", list(models.keys()))
+                    maker = st.selectbox("Car Maker", catalog.makers)
                 with col2:
-                    model = st.selectbox("Car Model", get_models_for_maker(maker))
+                    model = st.selectbox("Car Model", catalog.models_for(maker))
                 col1, col2 = st.columns(2)
                 with col1:
-                    fuel_type = st.selectbox("Fuel Type", fuel_types)
+                    fuel_type = st.selectbox("Fuel Type", catalog.fuel_types)
                 with col2:
-                    transmission = st.selectbox("Transmission", transmission_types)
+                    transmission = st.selectbox("Transmission", catalog.transmission_types)
                 col1, col2 = st.columns(2)
                 with col1:
-                    variant = st.selectbox("Variant", variants)
+                    variant = st.selectbox("Variant", catalog.variants)
                 with col2:
-                    ownership = st.selectbox("Ownership", ownership_types)
+                    ownership = st.selectbox("Ownership", catalog.ownership_types)
                 col1, col2 = st.columns(2)
                 with col1:
                     year = st.number_input("Year of Manufacture", min_value=1990, max_value=2024, value=2020)
@@ -827,12 +1123,12 @@ def main():
                     price = st.number_input("Expected Price (₹)", min_value=0, value=500000)
                 col1, col2 = st.columns(2)
                 with col1:
-                    state = st.selectbox("State", list(locations.keys()))
+                    state = st.selectbox("State", catalog.states)
                 with col2:
-                    city = st.selectbox("City", get_cities_for_state(state))
+                    city = st.selectbox("City", catalog.cities_for(state))
                 phone = st.text_input("Contact Number")
                 contact_time = st.text_input("Preferred Contact Time (e.g., 10 AM - 6 PM)")
-                selected_features = st.multiselect("Extra Features", extra_features)
+                selected_features = st.multiselect("Extra Features", catalog.extra_features)
                 st.markdown("<div style='margin-bottom:10px;'></div>", unsafe_allow_html=True)
                 st.markdown("<div>", unsafe_allow_html=True)
                 for feature in selected_features:
@@ -849,6 +1145,17 @@ def main():
                 insurance = st.file_uploader("Upload Insurance Document", type=['pdf'])
                 submitted = st.form_submit_button("Submit Car Details", help="Submit your car for listing")
                 if submitted:
+                    listing_errors = catalog.validate({
+                        'maker': maker,
+                        'model': model,
+                        'fuel_type': fuel_type,
+                        'transmission': transmission,
+                        'variant': variant,
+                        'ownership': ownership,
+                        'state': state,
+                        'city': city,
+                        'extra_features': selected_features
+                    })
                     if len(car_images) > 8:
                         st.error("Maximum 8 car images allowed")
                     elif not car_images:
@@ -857,6 +1164,9 @@ def main():
                         st.error("Please upload RC Book")
                     elif not insurance:
                         st.error("Please upload Insurance Document")
+                    elif listing_errors:
+                        for error in listing_errors:
+                            st.error(error)
                     else:
                         seller_id = add_seller(
                             st.session_state.email_sell,
@@ -906,13 +1216,17 @@ def main():
                 <p>Get an instant, market-based price estimate for your car</p>
             </div>
         """, unsafe_allow_html=True)
+        if not catalog.has_estimates:
+            # Every select below would be empty and return None
+            st.error("Price estimates are unavailable right now: no listed car model or location has a known price.")
+            st.stop()
 
         with st.form("estimate_form"):
             col1, col2 = st.columns(2)
             with col1:
-                maker = st.selectbox("Car Maker", list(car_makes.keys()))
+                maker = st.selectbox("Car Maker", catalog.estimate_makers)
             with col2:
-                model_name = st.selectbox("Car Model", list(car_makes[maker].keys()))
+                model_name = st.selectbox("Car Model", catalog.estimate_models_by_maker[maker])
             col1, col2 = st.columns(2)
             with col1:
                 year = st.number_input("Year of Manufacture", min_value=1990, max_value=datetime.now().year, value=2020)
@@ -920,7 +1234,7 @@ def main():
                 km_driven = st.number_input("Kilometers Driven", min_value=0, value=10000)
             col1, col2 = st.columns(2)
             with col1:
-                fuel_type = st.selectbox("Fuel Type", fuel_types)
+                fuel_type = st.selectbox("Fuel Type", catalog.fuel_types)
             with col2:
                 transmission = st.selectbox("Transmission", transmission_types_estimate)
             col1, col2 = st.columns(2)
@@ -933,12 +1247,12 @@ def main():
                 drive_wheels = st.selectbox("Drive Wheels", ['FWD', 'RWD', '4WD'])
             with col2:
                 previous_owners = st.selectbox("Previous Owners", ['First Owner', 'Second Owner', 'Third Owner', 'Fourth Owner', 'Fifth Owner or More'])
-            state = st.selectbox("State", list(locations_estimate.keys()))
-            city = st.selectbox("City", locations_estimate[state]['cities'])
+            state = st.selectbox("State", catalog.estimate_states)
+            city = st.selectbox("City", catalog.estimate_cities_by_state[state])
             submitted = st.form_submit_button("Estimate Price")
 
         if submitted:
-            base_price = car_makes[maker][model_name] * 100000  # Convert lakhs to rupees
+            base_price = catalog.base_price(maker, model_name)
             estimated_price = calculate_price(
                 base_price, year, fuel_type, transmission, km_driven, condition,
                 body_style, drive_wheels, state, city, previous_owners
@@ -0,0 +1,460 @@
+"""Headless concurrent-session load test for TechCar2.
+
+Drives many simultaneous Streamlit sessions through ``main()`` with the
+``AppTest`` runner: buyers change Buy filters and page through images,
+sellers verify by OTP and submit cars, admins work the moderation queue.
+OTP delivery is stubbed so no email leaves the machine.
+
+Usage:
+    python benchmarks/loadtest.py --buyers 24 --sellers 6 --admins 2 --duration 60
+
+``AppTest`` swaps a process-global mock runtime in and out around every
+run, so two sessions cannot share a process; each session runs in its own
+worker process and the parent merges their results.
+
+SQLite connections wait on locks in short slices and retry, so time spent
+blocked on another session's lock is reported (``sqlite_lock_wait``)
+instead of disappearing into the busy timeout. A statement still blocked
+after ``--busy-timeout`` fails and counts as a lock error.
+
+AppTest cannot drive ``st.file_uploader`` yet, so a seller's final submission
+goes through the same ``add_seller``/``add_car``/``add_car_image``/
+``add_document`` calls the Sell form makes, from the seller's process.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.testing.v1 import AppTest
+
+import synthetic
+from carzone.utils import db, metrics, otp_sender
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "TechCar2.py")
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+STUB_OTP = "123456"
+# Longest single wait inside SQLite before the statement is retried and the
+# wait is counted
+LOCK_SLICE = 0.01
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_errors = 0
+        self.lock_waits = []
+
+    def add(self, action, elapsed):
+        self.latencies[action].append(elapsed * 1000)
+
+    def fail(self, action, message):
+        self.errors[action] += 1
+        if "database is locked" in message:
+            self.lock_errors += 1
+
+    def waited(self, elapsed):
+        self.lock_waits.append(elapsed * 1000)
+
+    def export(self):
+        return {
+            "latencies": dict(self.latencies),
+            "errors": dict(self.errors),
+            "lock_errors": self.lock_errors,
+            "lock_waits": self.lock_waits,
+        }
+
+    def merge(self, exported):
+        for action, values in exported["latencies"].items():
+            self.latencies[action].extend(values)
+        for action, count in exported["errors"].items():
+            self.errors[action] += count
+        self.lock_errors += exported["lock_errors"]
+        self.lock_waits.extend(exported["lock_waits"])
+
+
+def _is_lock_error(error):
+    message = str(error)
+    return "database is locked" in message or "database is busy" in message
+
+
+class _LockTiming:
+    """Retry a statement blocked by a lock in ``LOCK_SLICE`` steps, timing the wait."""
+
+    def __init__(self, stats, budget):
+        self._stats = stats
+        self._budget = budget
+
+    def _call(self, func, *args):
+        start = time.perf_counter()
+        blocked = False
+        while True:
+            try:
+                result = func(*args)
+            except sqlite3.OperationalError as e:
+                if not _is_lock_error(e):
+                    raise
+                blocked = True
+                if time.perf_counter() - start >= self._budget:
+                    self._stats.waited(time.perf_counter() - start)
+                    raise
+                continue
+            if blocked:
+                self._stats.waited(time.perf_counter() - start)
+            return result
+
+
+class _LockTimingCursor(_LockTiming):
+    def __init__(self, cursor, stats, budget):
+        super().__init__(stats, budget)
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, params=()):
+        self._call(self._cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        # Materialized so a retry sees the same rows
+        self._call(self._cursor.executemany, sql, list(seq_of_params))
+        return self
+
+
+class _LockTimingConnection(_LockTiming):
+    def __init__(self, conn, stats, budget):
+        super().__init__(stats, budget)
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def cursor(self):
+        return _LockTimingCursor(self._conn.cursor(), self._stats, self._budget)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        self._call(self._conn.commit)
+
+
+def install_stubs(db_path, busy_timeout, stats):
+    """Route the app at the load-test database and stub out OTP delivery."""
+    def connect():
+        conn = sqlite3.connect(db_path, timeout=LOCK_SLICE, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return _LockTimingConnection(conn, stats, busy_timeout)
+
+    db.get_db_connection = connect
+    otp_sender.send_otp = lambda email: (True, f"OTP sent to {email}")
+    otp_sender.verify_otp = lambda email, otp: (
+        (True, "OTP verified successfully") if otp == STUB_OTP else (False, "Invalid OTP")
+    )
+    # AppTest executes TechCar2.py afresh on every run and the wrappers check
+    # the flag when applied, so flipping it here is enough for SQL timings.
+    metrics.ENABLED = True
+
+
+def rerun(stats, action, at, step):
+    start = time.perf_counter()
+    try:
+        step(at)
+    except Exception as e:
+        stats.fail(action, str(e))
+        return False
+    stats.add(action, time.perf_counter() - start)
+    for exc in at.exception:
+        stats.fail(action, exc.message)
+    return True
+
+
+def widget(widgets, label):
+    for w in widgets:
+        if w.label == label:
+            return w
+    return None
+
+
+def by_key(widgets, key):
+    for w in widgets:
+        if w.key == key:
+            return w
+    return None
+
+
+def buyer_session(stats, stop, rng, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    rerun(stats, "initial_load", at, lambda a: a.run())
+    rerun(stats, "nav_buy", at, lambda a: a.button(key="nav_Buy").click().run())
+    while not stop.is_set():
+        maker = widget(at.selectbox, "Car Maker")
+        if maker is not None and rng.random() < 0.5:
+            choice = rng.choice(maker.options)
+            rerun(stats, "buy_filter", at, lambda a: maker.select(choice).run())
+            continue
+        next_buttons = [b for b in at.button if b.key and b.key.startswith("next_")]
+        if next_buttons:
+            button = rng.choice(next_buttons)
+            rerun(stats, "buy_image_page", at, lambda a: button.click().run())
+        else:
+            rerun(stats, "buy_refresh", at, lambda a: a.run())
+
+
+def seller_session(stats, stop, rng, timeout, images, document):
+    while not stop.is_set():
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        email = f"load{rng.randrange(10**9)}@example.com"
+        rerun(stats, "initial_load", at, lambda a: a.run())
+        rerun(stats, "nav_sell", at, lambda a: a.button(key="nav_Sell").click().run())
+
+        def send_otp(a):
+            a.text_input(key="sell_email").input(email)
+            a.button(key="send_otp_sell_btn").click().run()
+
+        def verify_otp(a):
+            a.text_input(key="sell_otp_input").input(STUB_OTP)
+            a.button(key="verify_otp_sell_btn").click().run()
+
+        def submit(a):
+            car = synthetic.generate_car(rng, 0, datetime.now())
+            seller_id = db.add_seller(email, "9000000000", car['state'], car['city'])
+            car_data = {key: car[key] for key in (
+                'maker', 'model', 'fuel_type', 'transmission', 'variant', 'year', 'km_driven',
+                'mileage', 'ownership', 'price', 'state', 'city'
+            )}
+            car_data['extra_features'] = [f.strip() for f in car['extra_features'].split(',') if f.strip()]
+            car_id = db.add_car(seller_id, car_data)
+            for image_bytes in images[:rng.randint(1, len(images))]:
+                db.add_car_image(car_id, image_bytes)
+            db.add_document(car_id, 'rc_book', document)
+            db.add_document(car_id, 'insurance', document)
+
+        rerun(stats, "sell_send_otp", at, send_otp)
+        rerun(stats, "sell_verify_otp", at, verify_otp)
+        rerun(stats, "sell_submit", at, submit)
+
+
+def admin_session(stats, stop, rng, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state["admin_logged_in"] = True
+    rerun(stats, "initial_load", at, lambda a: a.run())
+    rerun(stats, "nav_admin", at, lambda a: a.button(key="nav_Admin").click().run())
+
+    def bulk_approve_all(a):
+        a.radio(key="moderation_mode").set_value("Queue").run()
+        a.checkbox(key="moderation_select_all").check().run()
+        a.button(key="bulk_approve").click().run()
+
+    # Keyed lookups (at.radio(key=...), at.button(key=...)) raise when the
+    # widget is missing, so they only happen inside rerun(), where that is
+    # counted as an error instead of ending the session.
+    while not stop.is_set():
+        if rng.random() < 0.05:
+            rerun(stats, "admin_bulk_decision", at, bulk_approve_all)
+            continue
+        mode = by_key(at.radio, "moderation_mode")
+        if mode is None or mode.value != "Next Pending":
+            rerun(stats, "admin_next_pending", at, lambda a: a.radio(key="moderation_mode").set_value("Next Pending").run())
+        decision = "review_approve" if rng.random() < 0.8 else "review_reject"
+        if by_key(at.button, decision) is not None:
+            rerun(stats, "admin_decision", at, lambda a: a.button(key=decision).click().run())
+        else:
+            rerun(stats, "admin_refresh", at, lambda a: a.button(key="review_refresh").click().run())
+            time.sleep(0.5)
+
+
+SESSIONS = {
+    "buyer": buyer_session,
+    "seller": seller_session,
+    "admin": admin_session,
+}
+
+
+def run_session(kind, seed, args, extra, stop, results):
+    """Worker process entry point: one AppTest session, results sent back on ``results``."""
+    stats = Stats()
+    install_stubs(args["db_path"], args["busy_timeout"], stats)
+    try:
+        SESSIONS[kind](stats, stop, random.Random(seed), args["rerun_timeout"], *extra)
+    except Exception as e:
+        stats.fail(f"{kind}_session", repr(e))
+    totals, _, slow_queries = metrics.snapshot()
+    results.put({
+        "stats": stats.export(),
+        "sql": {name: value for name, value in totals.items() if name.startswith("sql.")},
+        "slow_queries": len(slow_queries),
+    })
+
+
+def merge_sql(into, totals):
+    for name, value in totals.items():
+        merged = into.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "bytes": 0})
+        merged["calls"] += value["calls"]
+        merged["total_ms"] = round(merged["total_ms"] + value["total_ms"], 2)
+        merged["max_ms"] = max(merged["max_ms"], value["max_ms"])
+        merged["rows"] += value["rows"]
+        merged["bytes"] += value["bytes"]
+        merged["avg_ms"] = round(merged["total_ms"] / merged["calls"], 3) if merged["calls"] else 0.0
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
+
+
+def summarize(stats, wall_seconds, sql, slow_queries):
+    report = {"wall_seconds": round(wall_seconds, 2), "actions": {}}
+    everything = []
+    for action in sorted(set(stats.latencies) | set(stats.errors)):
+        values = sorted(stats.latencies.get(action, ()))
+        everything.extend(values)
+        report["actions"][action] = {
+            "count": len(values),
+            "errors": stats.errors.get(action, 0),
+            "p50_ms": percentile(values, 0.50),
+            "p95_ms": percentile(values, 0.95),
+            "p99_ms": percentile(values, 0.99),
+        }
+    everything.sort()
+    report["reruns"] = len(everything)
+    report["throughput_per_s"] = round(len(everything) / wall_seconds, 2) if wall_seconds else 0.0
+    report["p50_ms"] = percentile(everything, 0.50)
+    report["p95_ms"] = percentile(everything, 0.95)
+    report["p99_ms"] = percentile(everything, 0.99)
+    report["errors"] = sum(stats.errors.values())
+    report["sqlite_lock_errors"] = stats.lock_errors
+    waits = sorted(stats.lock_waits)
+    report["sqlite_lock_wait"] = {
+        "count": len(waits),
+        "total_ms": round(sum(waits), 2),
+        "p50_ms": percentile(waits, 0.50),
+        "p95_ms": percentile(waits, 0.95),
+        "max_ms": round(waits[-1], 2) if waits else None,
+    }
+    report["sql"] = sql
+    report["slow_queries"] = slow_queries
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(synthetic.PRESETS), default="1k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--buyers", type=int, default=24)
+    parser.add_argument("--sellers", type=int, default=4)
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to keep sessions running")
+    parser.add_argument("--busy-timeout", type=float, default=5.0,
+                        help="seconds a statement may wait on a lock before failing")
+    parser.add_argument("--rerun-timeout", type=float, default=60.0, help="AppTest timeout per rerun")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Sessions write to the database, so each load test gets a fresh copy.
+    db_path = os.path.join(DATA_DIR, f"load_{args.preset}_{args.seed}.db")
+    print(f"Generating {args.preset} dataset at {db_path} ...", file=sys.stderr)
+    synthetic.populate(db_path, args.preset, args.seed)
+
+    rng = random.Random(args.seed)
+    images = [synthetic.make_image(rng, synthetic.PRESETS[args.preset]["image_size"]) for _ in range(4)]
+    document = synthetic.make_document(rng, synthetic.PRESETS[args.preset]["document_bytes"])
+
+    # Fresh interpreters: nothing Streamlit set up in this process leaks
+    # into the sessions
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    results = context.Queue()
+    session_args = {
+        "db_path": db_path, "busy_timeout": args.busy_timeout, "rerun_timeout": args.rerun_timeout,
+    }
+    plan = (
+        [("buyer", args.seed + i, ()) for i in range(args.buyers)]
+        + [("seller", args.seed + 1000 + i, (images, document)) for i in range(args.sellers)]
+        + [("admin", args.seed + 2000 + i, ()) for i in range(args.admins)]
+    )
+    processes = [
+        context.Process(target=run_session, args=(kind, seed, session_args, extra, stop, results), daemon=True)
+        for kind, seed, extra in plan
+    ]
+
+    print(f"Running {len(processes)} sessions for {args.duration:g}s ...", file=sys.stderr)
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    time.sleep(args.duration)
+    stop.set()
+    stats = Stats()
+    sql = {}
+    slow_queries = 0
+    # Drain before joining: a worker blocks on exit until its result is read
+    received = 0
+    while received < len(processes):
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            if any(process.is_alive() for process in processes):
+                continue
+            break
+        received += 1
+        stats.merge(result["stats"])
+        merge_sql(sql, result["sql"])
+        slow_queries += result["slow_queries"]
+    if received < len(processes):
+        # Workers that died without reporting, e.g. on a crash at import
+        stats.errors["session_lost"] += len(processes) - received
+    for process in processes:
+        process.join()
+    report = summarize(stats, time.perf_counter() - start, sql, slow_queries)
+    report["sessions"] = {"buyers": args.buyers, "sellers": args.sellers, "admins": args.admins}
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Timed benchmark scenarios for TechCar2's listing, admin and estimate paths.
+
+Usage:
+    python benchmarks/run_benchmarks.py --preset 1k --output bench-1k.json
+    python benchmarks/run_benchmarks.py --preset 1k --compare bench-1k.json
+
+The database is generated once per preset/seed and kept as a read-only
+template (pass --regenerate to rebuild it). Each run works on a fresh copy,
+with no snapshot or cache files left over, so sell_submission's writes never
+carry into the next run and runs from different commits measure the same
+data. Results are written as JSON so they can be diffed with --compare.
+Templates written by older versions of this script may already contain
+benchmark submissions; regenerate them once.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+
+# Choices offered by the Estimate form in TechCar2.main()
+CONDITIONS = ['Excellent', 'Good', 'Fair', 'Poor']
+BODY_STYLES = ['Sedan', 'Hatchback', 'Wagon', 'Hardtop', 'Convertible', 'SUV', 'MPV', 'Truck', 'Van', 'Bus', 'Mini', 'Other']
+DRIVE_WHEELS = ['FWD', 'RWD', '4WD']
+PREVIOUS_OWNERS = ['First Owner', 'Second Owner', 'Third Owner', 'Fourth Owner', 'Fifth Owner or More']
+
+REVIEW_SAMPLE = 50
+ESTIMATES_PER_RUN = 10_000
+FILTERS_PER_RUN = 20
+
+
+def fresh_copy(template):
+    """Copy ``template`` to a working database, dropping files a previous run left."""
+    from carzone.utils import shared_cache, snapshot
+
+    path = template[:-len(".db")] + ".run.db"
+    derived = [path, snapshot.snapshot_path(path), shared_cache.cache_path(path)]
+    for name in derived:
+        for stale in (name, f"{name}-wal", f"{name}-shm", f"{name}-journal"):
+            if os.path.exists(stale):
+                os.remove(stale)
+    shutil.copyfile(template, path)
+    return path
+
+
+def use_database(path):
+    """Point TechCar2 and the db helpers at the benchmark database."""
+    import TechCar2
+    from carzone.utils import db, metrics
+
+    def connect():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    db.get_db_connection = connect
+    TechCar2.get_db_connection = metrics.wrap_connection_factory(connect)
+    return TechCar2
+
+
+def scenario_browse_unfiltered(app):
+    return len(app.get_car_listings({}))
+
+
+def scenario_browse_filtered(app, filter_sets):
+    total = 0
+    for filters in filter_sets:
+        total += len(app.get_car_listings(filters))
+    return total
+
+
+def scenario_moderation_listing(app):
+    conn = app.get_db_connection()
+    cursor = conn.cursor()
+    app.get_admin_counts(cursor)
+    cars = app.get_pending_cars(cursor)
+    for car in cars[:REVIEW_SAMPLE]:
+        app.get_car_images(cursor, car['id'])
+        app.get_car_document(cursor, car['id'], 'rc_book')
+        app.get_car_document(cursor, car['id'], 'insurance')
+    conn.close()
+    return len(cars)
+
+
+def scenario_bulk_estimate(app, rng):
+    catalog = app.get_catalog()
+    transmissions = app.transmission_types_estimate
+    current_year = datetime.now().year
+    for _ in range(ESTIMATES_PER_RUN):
+        maker = rng.choice(catalog.estimate_makers)
+        model_name = rng.choice(catalog.estimate_models_by_maker[maker])
+        state = rng.choice(catalog.estimate_states)
+        app.calculate_price(
+            catalog.base_price(maker, model_name),
+            rng.randint(2005, current_year),
+            rng.choice(catalog.fuel_types),
+            rng.choice(transmissions),
+            rng.randint(0, 200000),
+            rng.choice(CONDITIONS),
+            rng.choice(BODY_STYLES),
+            rng.choice(DRIVE_WHEELS),
+            state,
+            rng.choice(catalog.estimate_cities_by_state[state]),
+            rng.choice(PREVIOUS_OWNERS)
+        )
+    return ESTIMATES_PER_RUN
+
+
+def scenario_sell_submission(app, rng, images, document):
+    car = synthetic.generate_car(rng, 0, datetime.now())
+    seller_id = app.add_seller(f"bench{rng.randrange(10**9)}@example.com", "9000000000", car['state'], car['city'])
+    car_data = {key: car[key] for key in (
+        'maker', 'model', 'fuel_type', 'transmission', 'variant', 'year', 'km_driven',
+        'mileage', 'ownership', 'price', 'state', 'city'
+    )}
+    car_data['extra_features'] = [f.strip() for f in car['extra_features'].split(',') if f.strip()]
+    car_id = app.add_car(seller_id, car_data)
+    for image_bytes in images:
+        app.add_car_image(car_id, image_bytes)
+    app.add_document(car_id, 'rc_book', document)
+    app.add_document(car_id, 'insurance', document)
+    return len(images)
+
+
+def time_scenario(func, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "runs": repeat,
+        "items": result,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path, out=sys.stderr):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"{'scenario':<24}{'baseline ms':>14}{'current ms':>14}{'change':>10}", file=out)
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            print(f"{name:<24}{'-':>14}{result['median_ms']:>14.2f}{'new':>10}", file=out)
+            continue
+        change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0.0
+        print(f"{name:<24}{before['median_ms']:>14.2f}{result['median_ms']:>14.2f}{change:>+9.1f}%", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(synthetic.PRESETS), default="1k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="*", help="subset of scenarios to run")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the synthetic database")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON file to compare medians against")
+    args = parser.parse_args()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db_path = os.path.join(DATA_DIR, f"bench_{args.preset}_{args.seed}.db")
+    if args.regenerate or not os.path.exists(db_path):
+        print(f"Generating {args.preset} dataset at {db_path} ...", file=sys.stderr)
+        synthetic.populate(
+            db_path, args.preset, args.seed,
+            progress=lambda done, total: print(f"  {done:,}/{total:,} cars", file=sys.stderr)
+        )
+
+    app = use_database(fresh_copy(db_path))
+    rng = random.Random(args.seed)
+    sell_images = [synthetic.make_image(rng, synthetic.PRESETS[args.preset]["image_size"]) for _ in range(4)]
+    sell_document = synthetic.make_document(rng, synthetic.PRESETS[args.preset]["document_bytes"])
+    filter_sets = synthetic.sample_filters(args.seed, FILTERS_PER_RUN)
+
+    # sell_submission writes to the run's copy, so it runs last to keep the
+    # read scenarios within this run on the template's data.
+    scenarios = {
+        "browse_unfiltered": lambda: scenario_browse_unfiltered(app),
+        "browse_filtered": lambda: scenario_browse_filtered(app, filter_sets),
+        "moderation_listing": lambda: scenario_moderation_listing(app),
+        "bulk_estimate": lambda: scenario_bulk_estimate(app, random.Random(args.seed)),
+        "sell_submission": lambda: scenario_sell_submission(app, rng, sell_images, sell_document),
+    }
+    selected = args.scenarios or list(scenarios)
+    unknown = set(selected) - set(scenarios)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "preset": args.preset,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "scenarios": {},
+    }
+    for name in selected:
+        print(f"Running {name} ...", file=sys.stderr)
+        results["scenarios"][name] = time_scenario(scenarios[name], args.repeat)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
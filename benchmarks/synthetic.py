@@ -0,0 +1,244 @@
+"""Deterministic synthetic data for TechCar2 benchmarks.
+
+Cars are drawn from the same catalog the app offers in its dropdowns, so
+filters used by the benchmarks hit realistic selectivities. As a bulk
+importer, populate() validates every generated car against that catalog.
+"""
+import io
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carzone.utils.catalog import get_catalog
+
+# Columns mirror what TechCar2.py reads from each table.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sellers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL,
+    phone TEXT,
+    state TEXT,
+    city TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS cars (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seller_id INTEGER NOT NULL REFERENCES sellers(id),
+    maker TEXT,
+    model TEXT,
+    fuel_type TEXT,
+    transmission TEXT,
+    variant TEXT,
+    year INTEGER,
+    km_driven INTEGER,
+    mileage REAL,
+    ownership TEXT,
+    price INTEGER,
+    state TEXT,
+    city TEXT,
+    extra_features TEXT,
+    status TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS car_images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    car_id INTEGER NOT NULL REFERENCES cars(id),
+    image_data BLOB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    car_id INTEGER NOT NULL REFERENCES cars(id),
+    document_type TEXT,
+    document_data BLOB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS buyer_inquiries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    car_id INTEGER NOT NULL REFERENCES cars(id),
+    name TEXT,
+    email TEXT,
+    phone TEXT,
+    message TEXT,
+    status TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Images are drawn from a small pool per preset; the largest preset keeps
+# the file in the low gigabytes by attaching photos to half the cars.
+PRESETS = {
+    "1k": {"cars": 1_000, "images_per_car": (1, 4), "image_size": (1024, 768), "document_bytes": 80_000},
+    "100k": {"cars": 100_000, "images_per_car": (1, 2), "image_size": (640, 480), "document_bytes": 8_000},
+    "1m": {"cars": 1_000_000, "images_per_car": (0, 1), "image_size": (320, 240), "document_bytes": 1_000},
+}
+
+IMAGE_POOL_SIZE = 16
+BATCH_SIZE = 10_000
+EPOCH = datetime(2024, 1, 1)
+STATUS_WEIGHTS = (("approved", 0.8), (None, 0.1), ("rejected", 0.1))
+
+
+def make_image(rng, size):
+    """Return JPEG bytes that compress like a real photo (gradients plus detail)."""
+    width, height = size
+    image = Image.new("RGB", size)
+    draw = ImageDraw.Draw(image)
+    top = tuple(rng.randrange(256) for _ in range(3))
+    bottom = tuple(rng.randrange(256) for _ in range(3))
+    for y in range(height):
+        t = y / max(height - 1, 1)
+        draw.line([(0, y), (width, y)], fill=tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)))
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 3 + 1), y0 + rng.randrange(height // 3 + 1)
+        draw.ellipse([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise(size, 48).convert("RGB")
+    image = Image.blend(image, noise, 0.25).filter(ImageFilter.SMOOTH)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def make_document(rng, nbytes):
+    body = bytes(rng.randrange(256) for _ in range(min(nbytes, 4096)))
+    body = (body * (nbytes // len(body) + 1))[:nbytes] if body else b""
+    return b"%PDF-1.4\n" + body + b"\n%%EOF\n"
+
+
+def _weighted_status(rng):
+    roll = rng.random()
+    for status, weight in STATUS_WEIGHTS:
+        if roll < weight:
+            return status
+        roll -= weight
+    return STATUS_WEIGHTS[-1][0]
+
+
+def generate_car(rng, seller_id, created_at):
+    catalog = get_catalog()
+    maker = rng.choice(catalog.makers)
+    state = rng.choice(catalog.states)
+    year = rng.randint(2005, 2024)
+    base = rng.lognormvariate(13.3, 0.6)  # median around 6 lakh
+    return {
+        "seller_id": seller_id,
+        "maker": maker,
+        "model": rng.choice(catalog.models_for(maker)),
+        "fuel_type": rng.choice(catalog.fuel_types),
+        "transmission": rng.choice(catalog.transmission_types),
+        "variant": rng.choice(catalog.variants),
+        "year": year,
+        "km_driven": rng.randint(1_000, 15_000) * max(2025 - year, 1),
+        "mileage": round(rng.uniform(9.0, 28.0), 1),
+        "ownership": rng.choice(catalog.ownership_types),
+        "price": int(round(base * 0.92 ** (2024 - year), -3)),
+        "state": state,
+        "city": rng.choice(catalog.cities_for(state)),
+        "extra_features": ", ".join(
+            rng.sample(catalog.extra_features, rng.randint(0, min(5, len(catalog.extra_features))))
+        ),
+        "status": _weighted_status(rng),
+        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def populate(path, preset="1k", seed=42, progress=None):
+    """Create (or replace) a SQLite database at ``path`` filled per ``preset``."""
+    config = PRESETS[preset]
+    catalog = get_catalog()
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    image_pool = [make_image(rng, config["image_size"]) for _ in range(IMAGE_POOL_SIZE)]
+    rc_book = make_document(rng, config["document_bytes"])
+    insurance = make_document(rng, config["document_bytes"])
+
+    n_cars = config["cars"]
+    n_sellers = max(n_cars // 3, 1)
+    span_seconds = 2 * 365 * 24 * 3600
+    sellers = []
+    for seller_id in range(1, n_sellers + 1):
+        state = rng.choice(catalog.states)
+        sellers.append((
+            seller_id, f"seller{seller_id}@example.com", f"9{rng.randrange(10**9):09d}",
+            state, rng.choice(catalog.cities_for(state)),
+            (EPOCH + timedelta(seconds=rng.randrange(span_seconds))).strftime("%Y-%m-%d %H:%M:%S"),
+        ))
+    conn.executemany("INSERT INTO sellers VALUES (?, ?, ?, ?, ?, ?)", sellers)
+
+    car_columns = (
+        "seller_id", "maker", "model", "fuel_type", "transmission", "variant", "year",
+        "km_driven", "mileage", "ownership", "price", "state", "city", "extra_features",
+        "status", "created_at",
+    )
+    car_sql = f"INSERT INTO cars (id, {', '.join(car_columns)}) VALUES ({', '.join('?' * (len(car_columns) + 1))})"
+    low, high = config["images_per_car"]
+    for start in range(1, n_cars + 1, BATCH_SIZE):
+        cars, images, documents, inquiries = [], [], [], []
+        for car_id in range(start, min(start + BATCH_SIZE, n_cars + 1)):
+            created_at = EPOCH + timedelta(seconds=rng.randrange(span_seconds))
+            car = generate_car(rng, rng.randint(1, n_sellers), created_at)
+            errors = catalog.validate(car)
+            if errors:
+                raise ValueError(f"Generated car {car_id} is not listable: {'; '.join(errors)}")
+            cars.append((car_id,) + tuple(car[column] for column in car_columns))
+            for _ in range(rng.randint(low, high)):
+                images.append((car_id, rng.choice(image_pool)))
+            documents.append((car_id, "rc_book", rc_book))
+            documents.append((car_id, "insurance", insurance))
+            if car["status"] == "approved" and rng.random() < 0.2:
+                inquiries.append((
+                    car_id, f"Buyer {car_id}", f"buyer{car_id}@example.com",
+                    f"8{rng.randrange(10**9):09d}", "Is this car still available?",
+                    "contacted" if rng.random() < 0.5 else None,
+                    (created_at + timedelta(days=rng.randint(1, 60))).strftime("%Y-%m-%d %H:%M:%S"),
+                ))
+        conn.executemany(car_sql, cars)
+        conn.executemany("INSERT INTO car_images (car_id, image_data) VALUES (?, ?)", images)
+        conn.executemany("INSERT INTO documents (car_id, document_type, document_data) VALUES (?, ?, ?)", documents)
+        conn.executemany(
+            "INSERT INTO buyer_inquiries (car_id, name, email, phone, message, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            inquiries
+        )
+        conn.commit()
+        if progress:
+            progress(min(start + BATCH_SIZE - 1, n_cars), n_cars)
+    conn.close()
+    return {"cars": n_cars, "sellers": n_sellers, "image_pool_bytes": sum(map(len, image_pool))}
+
+
+def sample_filters(seed, count):
+    """Deterministic Buy-page filter combinations, from broad to narrow."""
+    catalog = get_catalog()
+    rng = random.Random(seed)
+    filters = []
+    for i in range(count):
+        maker = rng.choice(catalog.makers)
+        state = rng.choice(catalog.states)
+        low = rng.choice([0, 200000, 500000, 1000000])
+        shape = i % 5
+        if shape == 0:
+            filters.append({"maker": maker})
+        elif shape == 1:
+            filters.append({"maker": maker, "model": rng.choice(catalog.models_for(maker))})
+        elif shape == 2:
+            filters.append({"state": state, "city": rng.choice(catalog.cities_for(state))})
+        elif shape == 3:
+            filters.append({"min_price": low or None, "max_price": low + 500000, "fuel_type": rng.choice(catalog.fuel_types)})
+        else:
+            filters.append({
+                "maker": maker, "transmission": rng.choice(catalog.transmission_types),
+                "state": state, "max_price": low + 1000000,
+            })
+    return filters
@@ -0,0 +1,310 @@
+"""Hot/cold archival of rejected listings and stale buyer inquiries.
+
+Cars rejected more than ``TECHCAR_ARCHIVE_REJECTED_DAYS`` ago (with their
+images, documents and inquiries) and contacted inquiries older than
+``TECHCAR_ARCHIVE_INQUIRY_DAYS`` are moved out of the live database into
+per-year archive files (``archive_<year>.db``, by the row's ``created_at``).
+The copy and the delete run in one transaction spanning both files, so a
+row is never in both places or in neither.
+
+Rejections are aged from ``moderation_decisions.decided_at``. Cars rejected
+before decisions were timestamped have no such row and fall back to their
+submission time.
+
+Rows are copied by column name. Columns added to a live table later are
+added to the archive tables on the next pass, so schema changes do not break
+archival.
+
+``start`` runs a background scheduler in each process, so passes happen on
+time whether or not anyone opens the Admin page.
+"""
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from carzone.utils import moderation
+
+REJECTED_AFTER_DAYS = int(os.environ.get("TECHCAR_ARCHIVE_REJECTED_DAYS", "30"))
+INQUIRY_AFTER_DAYS = int(os.environ.get("TECHCAR_ARCHIVE_INQUIRY_DAYS", "90"))
+RUN_INTERVAL = float(os.environ.get("TECHCAR_ARCHIVE_INTERVAL", str(24 * 3600)))
+# A failed pass is retried after this long rather than on the next rerun
+RETRY_INTERVAL = min(float(os.environ.get("TECHCAR_ARCHIVE_RETRY", "3600")), RUN_INTERVAL)
+# How often the scheduler checks whether a pass is due
+POLL_INTERVAL = 60.0
+
+# Child tables first, so deletes never orphan rows mid-transaction.
+CAR_TABLES = (
+    ("moderation_decisions", "car_id"),
+    ("buyer_inquiries", "car_id"),
+    ("documents", "car_id"),
+    ("car_images", "car_id"),
+    ("cars", "id"),
+)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_start_lock = threading.Lock()
+_scheduler = None
+
+
+def _live_path(conn):
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not path:
+        raise RuntimeError("Archival requires a file-backed database")
+    return path
+
+
+def archive_dir(live_path):
+    return os.environ.get("TECHCAR_ARCHIVE_DIR") or os.path.join(os.path.dirname(live_path), "archive")
+
+
+def _columns(conn, schema, table):
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _ensure_tables(conn):
+    """Create or extend the archive tables; returns ``{table: quoted live column list}``."""
+    columns = {}
+    for table, key in CAR_TABLES:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS arch.{table} AS SELECT * FROM main.{table} WHERE 0")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS arch.idx_{table}_{key} ON {table}({key})")
+        live = _columns(conn, "main", table)
+        archived = {name for name, _ in _columns(conn, "arch", table)}
+        for name, declared in live:
+            if name not in archived:
+                conn.execute(f'ALTER TABLE arch.{table} ADD COLUMN "{name}" {declared}')
+        columns[table] = ", ".join(f'"{name}"' for name, _ in live)
+    return columns
+
+
+def _move(conn, year, car_ids, inquiry_ids, directory):
+    path = os.path.join(directory, f"archive_{year}.db")
+    conn.execute("ATTACH DATABASE ? AS arch", (path,))
+    try:
+        columns = _ensure_tables(conn)
+        conn.execute("DELETE FROM temp.cold_cars")
+        conn.executemany("INSERT INTO temp.cold_cars VALUES (?)", [(i,) for i in car_ids])
+        conn.execute("DELETE FROM temp.cold_inquiries")
+        conn.executemany("INSERT INTO temp.cold_inquiries VALUES (?)", [(i,) for i in inquiry_ids])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, key in CAR_TABLES:
+                conn.execute(
+                    f"INSERT INTO arch.{table} ({columns[table]}) SELECT {columns[table]} FROM main.{table} "
+                    f"WHERE {key} IN (SELECT id FROM temp.cold_cars)"
+                )
+            inquiry_columns = columns["buyer_inquiries"]
+            conn.execute(
+                f"INSERT INTO arch.buyer_inquiries ({inquiry_columns}) SELECT {inquiry_columns} "
+                "FROM main.buyer_inquiries WHERE id IN (SELECT id FROM temp.cold_inquiries)"
+            )
+            for table, key in CAR_TABLES:
+                conn.execute(f"DELETE FROM main.{table} WHERE {key} IN (SELECT id FROM temp.cold_cars)")
+            conn.execute("DELETE FROM main.buyer_inquiries WHERE id IN (SELECT id FROM temp.cold_inquiries)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH DATABASE arch")
+
+
+def run(get_connection, now=None):
+    """Move cold rows into the archive files; returns ``(cars, inquiries)`` moved."""
+    now = now or datetime.now()
+    car_cutoff = (now - timedelta(days=REJECTED_AFTER_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    inquiry_cutoff = (now - timedelta(days=INQUIRY_AFTER_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    # A plain connection in autocommit mode: transactions are managed
+    # explicitly so ATTACH/DETACH never happen inside one.
+    source = get_connection()
+    live_path = _live_path(source)
+    source.close()
+    directory = archive_dir(live_path)
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(live_path, timeout=30, isolation_level=None)
+    try:
+        moderation.ensure_tables(conn)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS cold_cars (id INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS cold_inquiries (id INTEGER PRIMARY KEY)")
+        by_year = {}
+        for car_id, year in conn.execute(
+            """
+            SELECT c.id, strftime('%Y', c.created_at)
+            FROM cars c
+            LEFT JOIN moderation_decisions md ON md.car_id = c.id
+            WHERE c.status = 'rejected' AND COALESCE(md.decided_at, c.created_at) < ?
+            """,
+            (car_cutoff,)
+        ):
+            by_year.setdefault(year or "unknown", ([], []))[0].append(car_id)
+        cold_car_ids = {car_id for cars, _ in by_year.values() for car_id in cars}
+        for inquiry_id, car_id, year in conn.execute(
+            """
+            SELECT id, car_id, strftime('%Y', created_at)
+            FROM buyer_inquiries
+            WHERE status = 'contacted' AND created_at < ?
+            """,
+            (inquiry_cutoff,)
+        ):
+            if car_id in cold_car_ids:
+                # Moved along with its car
+                continue
+            by_year.setdefault(year or "unknown", ([], []))[1].append(inquiry_id)
+        for year, (car_ids, inquiry_ids) in sorted(by_year.items()):
+            _move(conn, year, car_ids, inquiry_ids, directory)
+    finally:
+        conn.close()
+    moved_cars = sum(len(cars) for cars, _ in by_year.values())
+    moved_inquiries = sum(len(inquiries) for _, inquiries in by_year.values())
+    with open(os.path.join(directory, ".last_run"), "w") as f:
+        f.write(f"{now.isoformat(timespec='seconds')} cars={moved_cars} inquiries={moved_inquiries}\n")
+    return moved_cars, moved_inquiries
+
+
+def _marker_path(get_connection):
+    conn = get_connection()
+    try:
+        return os.path.join(archive_dir(_live_path(conn)), ".last_run")
+    finally:
+        conn.close()
+
+
+def _record_failure(marker, error):
+    """Note a failed pass and date the marker so the next try is RETRY_INTERVAL away."""
+    try:
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w") as f:
+            f.write(f"{datetime.now().isoformat(timespec='seconds')} failed: {error}\n")
+        retry_at = time.time() - RUN_INTERVAL + RETRY_INTERVAL
+        os.utime(marker, (retry_at, retry_at))
+    except OSError:
+        pass
+
+
+def run_now(get_connection):
+    """Run a pass unless one is already in progress; returns ``run``'s counts or None."""
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        return run(get_connection)
+    finally:
+        _lock.release()
+
+
+def maybe_run(get_connection):
+    """Run a pass in this thread if the last one (by any process) is older than the interval."""
+    if _lock.locked():
+        return
+    marker = _marker_path(get_connection)
+    try:
+        if time.time() - os.path.getmtime(marker) < RUN_INTERVAL:
+            return
+    except FileNotFoundError:
+        pass
+    try:
+        run_now(get_connection)
+    except (sqlite3.Error, OSError) as error:
+        # Busy, locked or out of disk; back off instead of retrying on
+        # every poll.
+        logger.warning("Archival pass failed, retrying in %gs: %r", RETRY_INTERVAL, error)
+        _record_failure(marker, error)
+
+
+def _schedule_loop(get_connection):
+    while True:
+        time.sleep(POLL_INTERVAL)
+        try:
+            maybe_run(get_connection)
+        except (sqlite3.Error, OSError, RuntimeError) as error:
+            # The live database could not be opened to find the marker;
+            # try again on the next poll.
+            logger.warning("Archive scheduler check failed: %r", error)
+
+
+def start(get_connection):
+    """Start this process's archival scheduler once; later calls do nothing."""
+    global _scheduler
+    if _scheduler is not None:
+        return
+    with _start_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(
+                target=_schedule_loop, args=(get_connection,), name="archive-scheduler", daemon=True
+            )
+            _scheduler.start()
+
+
+def _archive_files(get_connection):
+    conn = get_connection()
+    try:
+        directory = archive_dir(_live_path(conn))
+    finally:
+        conn.close()
+    return sorted(glob.glob(os.path.join(directory, "archive_*.db")), reverse=True)
+
+
+def _open_readonly(path):
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def find_cars(get_connection, car_id=None, seller_ids=()):
+    """Archived cars by id or seller, each with its images and documents."""
+    conditions, params = [], []
+    if car_id:
+        conditions.append("id = ?")
+        params.append(car_id)
+    if seller_ids:
+        conditions.append(f"seller_id IN ({', '.join('?' * len(seller_ids))})")
+        params.extend(seller_ids)
+    if not conditions:
+        return []
+    results = []
+    for path in _archive_files(get_connection):
+        conn = _open_readonly(path)
+        try:
+            for car in conn.execute(f"SELECT * FROM cars WHERE {' OR '.join(conditions)}", params).fetchall():
+                record = dict(car)
+                record['archive'] = os.path.basename(path)
+                record['images'] = [row[0] for row in conn.execute(
+                    "SELECT image_data FROM car_images WHERE car_id = ? ORDER BY id", (car['id'],)
+                )]
+                record['documents'] = {row[0]: row[1] for row in conn.execute(
+                    "SELECT document_type, document_data FROM documents WHERE car_id = ?", (car['id'],)
+                )}
+                results.append(record)
+        finally:
+            conn.close()
+    return results
+
+
+def find_inquiries(get_connection, email=None, car_id=None):
+    """Archived buyer inquiries by buyer email or car id."""
+    conditions, params = [], []
+    if email:
+        conditions.append("email = ?")
+        params.append(email)
+    if car_id:
+        conditions.append("car_id = ?")
+        params.append(car_id)
+    if not conditions:
+        return []
+    results = []
+    for path in _archive_files(get_connection):
+        conn = _open_readonly(path)
+        try:
+            for row in conn.execute(f"SELECT * FROM buyer_inquiries WHERE {' OR '.join(conditions)}", params):
+                record = dict(row)
+                record['archive'] = os.path.basename(path)
+                results.append(record)
+        finally:
+            conn.close()
+    return results
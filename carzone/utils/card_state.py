@@ -0,0 +1,91 @@
+"""Compact, bounded per-session UI state for Buy page cards.
+
+Replaces the ``img_idx_{id}``/``details_{id}``/``contact_{id}``/
+``otp_email_{id}`` session keys with one LRU map stored under a single
+session key. Only cards that differ from the default state are kept, cards
+that leave the result list are dropped, and the map never exceeds
+``capacity`` entries, so session size stays flat however long a buyer
+browses.
+"""
+from collections import OrderedDict
+
+SESSION_KEY = "card_state"
+DEFAULT_CAPACITY = 64
+
+
+class CardState:
+    __slots__ = ("img_idx", "details", "contact", "otp_email")
+
+    def __init__(self, img_idx=0, details=False, contact=False, otp_email=None):
+        self.img_idx = img_idx
+        self.details = details
+        self.contact = contact
+        self.otp_email = otp_email
+
+    def is_default(self):
+        return not (self.img_idx or self.details or self.contact or self.otp_email)
+
+    def __getstate__(self):
+        return (self.img_idx, self.details, self.contact, self.otp_email)
+
+    def __setstate__(self, state):
+        self.img_idx, self.details, self.contact, self.otp_email = state
+
+
+_DEFAULT = CardState()
+
+
+class CardStateStore:
+    """LRU map of car id -> :class:`CardState`, touched only on writes.
+
+    Reads never insert or reorder, so rendering a long result list cannot
+    push out the card a buyer just interacted with.
+    """
+
+    __slots__ = ("capacity", "_cards")
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._cards = OrderedDict()
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __getstate__(self):
+        return (self.capacity, [(car_id, state.__getstate__()) for car_id, state in self._cards.items()])
+
+    def __setstate__(self, state):
+        self.capacity, cards = state
+        self._cards = OrderedDict()
+        for car_id, values in cards:
+            self._cards[car_id] = CardState(*values)
+
+    def get(self, car_id):
+        """State for ``car_id``; the shared default if nothing was stored."""
+        return self._cards.get(car_id, _DEFAULT)
+
+    def update(self, car_id, **changes):
+        state = self._cards.pop(car_id, None)
+        if state is None:
+            state = CardState()
+        for name, value in changes.items():
+            setattr(state, name, value)
+        if state.is_default():
+            return
+        self._cards[car_id] = state
+        while len(self._cards) > self.capacity:
+            self._cards.popitem(last=False)
+
+    def retain(self, visible_ids):
+        """Drop state for every card not in ``visible_ids``."""
+        visible = set(visible_ids)
+        for car_id in [car_id for car_id in self._cards if car_id not in visible]:
+            del self._cards[car_id]
+
+
+def get_card_store(session_state, capacity=DEFAULT_CAPACITY):
+    store = session_state.get(SESSION_KEY)
+    if store is None:
+        store = CardStateStore(capacity)
+        session_state[SESSION_KEY] = store
+    return store
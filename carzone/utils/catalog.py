@@ -0,0 +1,200 @@
+"""Precompiled, immutable vehicle and location catalog.
+
+The Buy, Sell and Estimate pages used to rebuild maker/model and state/city
+lists from the dropdown dicts on every rerun, and Estimate offered its own
+``car_makes`` names, which could disagree with what sellers can list.
+``get_catalog()`` compiles everything once per process from the dropdowns,
+which are the single source of valid combinations; Estimate prices are
+joined onto that, so Estimate only offers models that can also be listed.
+
+All lookups are tuples, frozensets or read-only mappings, safe to share
+across sessions and threads.
+
+Priced models missing from the dropdowns are logged when the catalog is
+built. So is an empty Estimate overlap; the Estimate page then shows an
+error instead of the form.
+"""
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Catalog:
+    makers: Tuple[str, ...]
+    maker_ids: Mapping[str, int]
+    models_by_maker: Mapping[str, Tuple[str, ...]]
+    model_ids: Mapping[Tuple[str, str], int]
+    states: Tuple[str, ...]
+    state_ids: Mapping[str, int]
+    cities_by_state: Mapping[str, Tuple[str, ...]]
+    city_ids: Mapping[Tuple[str, str], int]
+    states_by_city: Mapping[str, Tuple[str, ...]]
+    fuel_types: Tuple[str, ...]
+    transmission_types: Tuple[str, ...]
+    ownership_types: Tuple[str, ...]
+    variants: Tuple[str, ...]
+    extra_features: Tuple[str, ...]
+    # Submitted field name -> accepted values, for validate()
+    allowed_values: Mapping[str, FrozenSet[str]]
+    # Estimate page: base prices in lakhs, limited to listable models and to
+    # locations the price model knows
+    base_prices: Mapping[Tuple[str, str], float]
+    estimate_makers: Tuple[str, ...]
+    estimate_models_by_maker: Mapping[str, Tuple[str, ...]]
+    estimate_states: Tuple[str, ...]
+    estimate_cities_by_state: Mapping[str, Tuple[str, ...]]
+    # Entries of car_makes with no matching dropdown model, for diagnostics
+    unlisted_priced_models: Tuple[Tuple[str, str], ...]
+
+    def models_for(self, maker):
+        return self.models_by_maker.get(maker, ())
+
+    def cities_for(self, state):
+        return self.cities_by_state.get(state, ())
+
+    def is_valid_model(self, maker, model):
+        return (maker, model) in self.model_ids
+
+    def is_valid_city(self, state, city):
+        return (state, city) in self.city_ids
+
+    @property
+    def has_estimates(self):
+        """Whether Estimate has at least one model and one location to offer."""
+        return bool(self.estimate_makers and self.estimate_states)
+
+    def base_price(self, maker, model):
+        """Estimate base price in rupees."""
+        return self.base_prices[(maker, model)] * 100000
+
+    def validate(self, car):
+        """Problems with a submitted car dict, as messages; empty when valid.
+
+        Shared by the Sell form and bulk importers. Every check is a hash
+        lookup against the compiled sets.
+        """
+        errors = []
+        if not self.is_valid_model(car.get('maker'), car.get('model')):
+            errors.append(f"Unknown car model: {car.get('maker')} {car.get('model')}")
+        if not self.is_valid_city(car.get('state'), car.get('city')):
+            errors.append(f"Unknown location: {car.get('city')}, {car.get('state')}")
+        for field in ('fuel_type', 'transmission', 'ownership', 'variant'):
+            if field in car and car[field] not in self.allowed_values[field]:
+                errors.append(f"Unknown {field.replace('_', ' ')}: {car[field]}")
+        features = car.get('extra_features') or ()
+        if isinstance(features, str):
+            features = [feature.strip() for feature in features.split(',') if feature.strip()]
+        unknown = [feature for feature in features if feature not in self.allowed_values['extra_features']]
+        if unknown:
+            errors.append(f"Unknown extra features: {', '.join(unknown)}")
+        return errors
+
+
+def _unique(values):
+    return tuple(dict.fromkeys(values))
+
+
+def build_catalog(models, locations, get_models_for_maker, get_cities_for_state,
+                  fuel_types, transmission_types, ownership_types, variants, extra_features,
+                  car_makes=None, estimate_locations=None):
+    """Compile a :class:`Catalog` from the dropdown and Estimate sources."""
+    makers = _unique(models.keys())
+    models_by_maker = {maker: _unique(get_models_for_maker(maker)) for maker in makers}
+    model_ids = {}
+    for maker in makers:
+        for model in models_by_maker[maker]:
+            model_ids[(maker, model)] = len(model_ids)
+
+    states = _unique(locations.keys())
+    cities_by_state = {state: _unique(get_cities_for_state(state)) for state in states}
+    city_ids, states_by_city = {}, {}
+    for state in states:
+        for city in cities_by_state[state]:
+            city_ids[(state, city)] = len(city_ids)
+            states_by_city.setdefault(city, []).append(state)
+
+    base_prices = {}
+    unlisted = []
+    for maker, priced in (car_makes or {}).items():
+        for model, price in priced.items():
+            if (maker, model) in model_ids:
+                base_prices[(maker, model)] = price
+            else:
+                unlisted.append((maker, model))
+    estimate_models_by_maker = {
+        maker: tuple(model for model in models_by_maker[maker] if (maker, model) in base_prices)
+        for maker in makers
+    }
+    estimate_models_by_maker = {maker: names for maker, names in estimate_models_by_maker.items() if names}
+
+    estimate_cities_by_state = {}
+    for state in states:
+        if estimate_locations is None:
+            estimate_cities_by_state[state] = cities_by_state[state]
+        elif state in estimate_locations:
+            known = set(estimate_locations[state].get('cities', ()))
+            cities = tuple(city for city in cities_by_state[state] if city in known)
+            if cities:
+                estimate_cities_by_state[state] = cities
+
+    if unlisted:
+        logger.warning(
+            "Estimate prices models sellers cannot list, which are left out: %s",
+            ", ".join(f"{maker} {model}" for maker, model in unlisted)
+        )
+    if not estimate_models_by_maker or not estimate_cities_by_state:
+        logger.error(
+            "Estimate has nothing to offer: %d priced model(s) and %d priced state(s) match the dropdowns",
+            len(base_prices), len(estimate_cities_by_state)
+        )
+
+    options = {
+        'fuel_type': _unique(fuel_types),
+        'transmission': _unique(transmission_types),
+        'ownership': _unique(ownership_types),
+        'variant': _unique(variants),
+        'extra_features': _unique(extra_features),
+    }
+    return Catalog(
+        makers=makers,
+        maker_ids=MappingProxyType({maker: i for i, maker in enumerate(makers)}),
+        models_by_maker=MappingProxyType(models_by_maker),
+        model_ids=MappingProxyType(model_ids),
+        states=states,
+        state_ids=MappingProxyType({state: i for i, state in enumerate(states)}),
+        cities_by_state=MappingProxyType(cities_by_state),
+        city_ids=MappingProxyType(city_ids),
+        states_by_city=MappingProxyType({city: tuple(names) for city, names in states_by_city.items()}),
+        fuel_types=options['fuel_type'],
+        transmission_types=options['transmission'],
+        ownership_types=options['ownership'],
+        variants=options['variant'],
+        extra_features=options['extra_features'],
+        allowed_values=MappingProxyType({field: frozenset(values) for field, values in options.items()}),
+        base_prices=MappingProxyType(base_prices),
+        estimate_makers=tuple(estimate_models_by_maker),
+        estimate_models_by_maker=MappingProxyType(estimate_models_by_maker),
+        estimate_states=tuple(estimate_cities_by_state),
+        estimate_cities_by_state=MappingProxyType(estimate_cities_by_state),
+        unlisted_priced_models=tuple(unlisted),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_catalog():
+    """The process-wide catalog, compiled on first use."""
+    from carzone.utils import dropdowns
+    from carzone.pages import Estimate
+
+    return build_catalog(
+        dropdowns.models, dropdowns.locations,
+        dropdowns.get_models_for_maker, dropdowns.get_cities_for_state,
+        dropdowns.fuel_types, dropdowns.transmission_types, dropdowns.ownership_types,
+        dropdowns.variants, dropdowns.extra_features,
+        car_makes=Estimate.car_makes, estimate_locations=Estimate.locations,
+    )
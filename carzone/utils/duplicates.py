@@ -0,0 +1,275 @@
+"""Near-duplicate photo detection for Sell submissions.
+
+Every image passed to ``add_car_image`` gets a 64-bit difference hash
+(dHash): re-encoded, resized or lightly edited copies of a photo land within
+a few bits of each other. Hashes are stored in ``image_hashes`` and kept in
+a per-process BK-tree keyed on Hamming distance, so each upload is checked
+against the whole corpus while visiting only a small part of it. Hits
+against other cars are recorded in ``duplicate_flags`` for the review queue.
+
+Images stored before this existed can be hashed with
+``python -m carzone.utils.duplicates``.
+
+The check is best effort: an image that cannot be decoded or a locked
+database is logged and skipped, never failing the upload; ``backfill`` picks
+such images up later.
+"""
+import io
+import logging
+import os
+import sqlite3
+import threading
+from collections import Counter
+from functools import wraps
+
+from PIL import Image
+
+from carzone.utils import metrics
+
+MAX_DISTANCE = int(os.environ.get("TECHCAR_DUPLICATE_DISTANCE", "10"))
+HASH_SIZE = 8
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_hashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    car_id INTEGER NOT NULL,
+    hash INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_image_hashes_car_id ON image_hashes(car_id);
+CREATE TABLE IF NOT EXISTS duplicate_flags (
+    car_id INTEGER NOT NULL,
+    matched_car_id INTEGER NOT NULL,
+    distance INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (car_id, matched_car_id)
+);
+"""
+
+
+@metrics.timed("duplicates.dhash")
+def dhash(data):
+    """64-bit difference hash of an encoded image, or None if undecodable."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    except Exception as error:
+        # Not just OSError: decompression bombs and broken plugin data raise
+        # their own exception types
+        logger.warning("Could not hash image: %r", error)
+        return None
+    pixels = image.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _to_sql(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _from_sql(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class BKTree:
+    """BK-tree over 64-bit hashes; each node holds the cars sharing its hash."""
+
+    def __init__(self):
+        self._root = None
+        self.last_id = 0
+
+    def add(self, value, car_id):
+        if self._root is None:
+            self._root = (value, {car_id}, {})
+            return
+        node = self._root
+        while True:
+            distance = bin(node[0] ^ value).count("1")
+            if distance == 0:
+                node[1].add(car_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, {car_id}, {})
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """``{car_id: distance}`` for every stored hash within ``max_distance``."""
+        found = {}
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_value, car_ids, children = stack.pop()
+            distance = bin(node_value ^ value).count("1")
+            if distance <= max_distance:
+                for car_id in car_ids:
+                    if distance < found.get(car_id, max_distance + 1):
+                        found[car_id] = distance
+            # Triangle inequality: only these subtrees can hold matches
+            for edge in range(max(distance - max_distance, 1), distance + max_distance + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        return found
+
+
+_lock = threading.Lock()
+_tree = None
+
+
+def ensure_tables(conn):
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def _sync(conn):
+    """The process-wide tree, with hashes other workers stored added in."""
+    global _tree
+    if _tree is None:
+        ensure_tables(conn)
+        _tree = BKTree()
+    rows = conn.execute(
+        "SELECT id, car_id, hash FROM image_hashes WHERE id > ? ORDER BY id", (_tree.last_id,)
+    ).fetchall()
+    for row_id, car_id, value in rows:
+        _tree.add(_from_sql(value), car_id)
+        _tree.last_id = row_id
+    return _tree
+
+
+def check_image(get_connection, car_id, data):
+    """Hash an uploaded image, flag cars it nearly duplicates and index it.
+
+    Returns ``{matched_car_id: distance}``; photos of the same car are not
+    reported against each other.
+    """
+    value = dhash(data)
+    if value is None:
+        return {}
+    return _check_hash(get_connection, car_id, value)
+
+
+def _check_hash(get_connection, car_id, value):
+    conn = None
+    try:
+        conn = get_connection()
+        with _lock:
+            tree = _sync(conn)
+            matches = {
+                other: distance
+                for other, distance in tree.search(value, MAX_DISTANCE).items()
+                if other != car_id
+            }
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO image_hashes (car_id, hash) VALUES (?, ?)", (car_id, _to_sql(value)))
+            if matches:
+                cursor.executemany(
+                    """
+                    INSERT INTO duplicate_flags (car_id, matched_car_id, distance) VALUES (?, ?, ?)
+                    ON CONFLICT (car_id, matched_car_id) DO UPDATE SET distance = MIN(distance, excluded.distance)
+                    """,
+                    [(car_id, other, distance) for other, distance in matches.items()]
+                )
+            conn.commit()
+            # Picks up this hash along with any stored by other workers since
+            # the last sync, so last_id never skips a row
+            _sync(conn)
+    except sqlite3.Error as error:
+        logger.warning("Duplicate check skipped for car %s: %r", car_id, error)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+        return {}
+    finally:
+        if conn is not None:
+            conn.close()
+    return matches
+
+
+def checking(add_car_image, get_connection):
+    """Wrap ``add_car_image`` so every stored image is also duplicate-checked.
+
+    ``get_connection`` is called per image, so pass a function that looks up
+    the current factory if callers may swap it after import.
+    """
+    @wraps(add_car_image)
+    def wrapper(car_id, image_data, *args, **kwargs):
+        result = add_car_image(car_id, image_data, *args, **kwargs)
+        check_image(get_connection, car_id, image_data)
+        return result
+
+    return wrapper
+
+
+def flags_for(cursor, car_ids):
+    """``{car_id: [(matched_car_id, distance, matched_status), ...]}`` closest first."""
+    car_ids = list(car_ids)
+    if not car_ids:
+        return {}
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'duplicate_flags'")
+    if cursor.fetchone() is None:
+        return {}
+    cursor.execute(
+        f"""
+        SELECT df.car_id, df.matched_car_id, df.distance, c.status
+        FROM duplicate_flags df
+        LEFT JOIN cars c ON df.matched_car_id = c.id
+        WHERE df.car_id IN ({', '.join('?' * len(car_ids))})
+        ORDER BY df.car_id, df.distance
+        """,
+        car_ids
+    )
+    flags = {}
+    for car_id, matched_car_id, distance, status in cursor.fetchall():
+        flags.setdefault(car_id, []).append((matched_car_id, distance, status or 'archived'))
+    return flags
+
+
+def backfill(get_connection):
+    """Hash stored images that were never hashed; returns the count.
+
+    Covers cars that predate duplicate detection and uploads whose check was
+    skipped. Hashes are not linked to image rows, so a car with fewer hashes
+    than images has each image re-hashed and only the unmatched ones stored.
+    """
+    conn = get_connection()
+    try:
+        ensure_tables(conn)
+        pending = [row[0] for row in conn.execute("""
+            SELECT ci.car_id FROM car_images ci
+            GROUP BY ci.car_id
+            HAVING COUNT(*) > (SELECT COUNT(*) FROM image_hashes ih WHERE ih.car_id = ci.car_id)
+            ORDER BY ci.car_id
+        """).fetchall()]
+        done = 0
+        for car_id in pending:
+            stored = Counter(
+                _from_sql(row[0])
+                for row in conn.execute("SELECT hash FROM image_hashes WHERE car_id = ?", (car_id,))
+            )
+            image_ids = [
+                row[0] for row in conn.execute("SELECT id FROM car_images WHERE car_id = ? ORDER BY id", (car_id,))
+            ]
+            for image_id in image_ids:
+                data = conn.execute("SELECT image_data FROM car_images WHERE id = ?", (image_id,)).fetchone()[0]
+                value = dhash(bytes(data)) if data else None
+                if value is None:
+                    continue
+                if stored[value]:
+                    stored[value] -= 1
+                    continue
+                _check_hash(get_connection, car_id, value)
+                done += 1
+        return done
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from carzone.utils.db import get_db_connection
+
+    print(f"Hashed {backfill(get_db_connection)} image(s)")
@@ -0,0 +1,343 @@
+"""Small HTTP endpoint serving car images by id.
+
+Buy cards and the admin review page emit image URLs instead of pushing
+decoded images through the Streamlit websocket on every rerun. Responses
+carry a content-hash ETag and long-lived ``Cache-Control``, and support
+single ``Range`` requests, so browsers cache them and repeat views never
+reach the app.
+
+Images of approved cars are public. Any other image needs a ``sig``
+parameter signed with ``TECHCAR_IMAGE_SECRET``.
+
+The endpoint is only used when ``TECHCAR_IMAGE_BASE_URL`` says where
+browsers can reach it (``localhost`` is wrong for any remote browser,
+Codespaces included). Without it, or when signed URLs could not be
+verified by whichever worker holds the port, pages fall back to sending
+image bytes inline; see ``serves_urls``. With several workers, set the same
+``TECHCAR_IMAGE_SECRET`` on all of them.
+"""
+import hashlib
+import hmac
+import io
+import logging
+import os
+import re
+import secrets
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import urlopen
+
+from PIL import Image
+
+from carzone.utils import metrics
+from carzone.utils import shared_cache
+
+HOST = os.environ.get("TECHCAR_IMAGE_HOST", "0.0.0.0")
+PORT = int(os.environ.get("TECHCAR_IMAGE_PORT", "8502"))
+BASE_URL = os.environ.get("TECHCAR_IMAGE_BASE_URL", "").rstrip("/")
+SECRET_CONFIGURED = bool(os.environ.get("TECHCAR_IMAGE_SECRET"))
+SECRET = os.environ.get("TECHCAR_IMAGE_SECRET", "").encode() or secrets.token_bytes(32)
+CACHE_BYTES = int(os.environ.get("TECHCAR_IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Derivative widths are fixed so the cache key space stays small.
+WIDTHS = (160, 320, 640, 960)
+PUBLIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PRIVATE_CACHE_CONTROL = "private, max-age=3600"
+
+_PATH_RE = re.compile(r"^/images/(\d+)$")
+HEALTH_PATH = "/healthz"
+HEALTH_BODY = b"techcar-images"
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# None until start(); then the server this process runs, PEER when another
+# TechCar2 worker on this host holds the port, or False when unavailable.
+_server = None
+PEER = "peer"
+
+
+class _ByteLRU:
+    """Thread-safe LRU bounded by the total size of cached bodies."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, item):
+        body = item[1]
+        if len(body) > self.capacity:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._items[key] = item
+            self.size += len(body)
+            while self.size > self.capacity:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted[1])
+
+
+_cache = _ByteLRU(CACHE_BYTES)
+
+
+def sign(image_id):
+    return hmac.new(SECRET, str(image_id).encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _nearest_width(width):
+    return min(WIDTHS, key=lambda w: abs(w - width)) if width else None
+
+
+def serves_urls(signed=False):
+    """Whether ``image_url`` links will resolve for browsers.
+
+    Signed links also need a secret the serving worker shares: either one
+    configured for every worker, or this process being the server.
+    """
+    if not BASE_URL or not _server:
+        return False
+    return not signed or SECRET_CONFIGURED or _server is not PEER
+
+
+def image_url(image_id, width=None, signed=False):
+    """URL for ``image_id``, optionally resized to the nearest allowed width."""
+    params = []
+    if width:
+        params.append(f"w={_nearest_width(width)}")
+    if signed:
+        params.append(f"sig={sign(image_id)}")
+    query = f"?{'&'.join(params)}" if params else ""
+    return f"{BASE_URL}/images/{image_id}{query}"
+
+
+def _content_type(data):
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    return "application/octet-stream"
+
+
+@metrics.timed("image_server.resize")
+def _resize(data, width):
+    image = Image.open(io.BytesIO(data))
+    if image.width > width:
+        image.thumbnail((width, width * image.height // image.width))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=82, optimize=True)
+    return buffer.getvalue()
+
+
+def _load(get_connection, image_id, width, signed):
+    """Return ``(etag, body, content_type)`` or None if not servable."""
+    key = (image_id, width, signed)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    # Image rows never change once stored, so derivatives need no generation
+    shared = shared_cache.get("image", key)
+    if shared is not shared_cache.MISS:
+        _cache.put(key, shared)
+        return shared
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            """
+            SELECT ci.image_data, c.status
+            FROM car_images ci
+            JOIN cars c ON ci.car_id = c.id
+            WHERE ci.id = ?
+            """,
+            (image_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None or not row[0] or (row[1] != 'approved' and not signed):
+        return None
+    data = bytes(row[0])
+    if width:
+        try:
+            data = _resize(data, width)
+        except OSError:
+            # Not decodable by PIL; serve the upload as stored.
+            pass
+    item = (f'"{hashlib.sha1(data).hexdigest()[:20]}"', data, _content_type(data))
+    _cache.put(key, item)
+    shared_cache.put("image", key, item)
+    return item
+
+
+def load(get_connection, image_id, width=None, signed=False):
+    """Image bytes for inline display when ``serves_urls`` is False, or None."""
+    item = _load(get_connection, image_id, _nearest_width(width), signed)
+    return item[1] if item else None
+
+
+def warm(get_connection, image_ids, width=None, signed=False):
+    """Load images into the caches in the background, so a later ``load`` is a hit."""
+    def run():
+        for image_id in image_ids:
+            try:
+                load(get_connection, image_id, width, signed)
+            except Exception as error:
+                logger.warning("Could not warm image %s: %r", image_id, error)
+                return
+
+    thread = threading.Thread(target=run, name="image-warm", daemon=True)
+    thread.start()
+    return thread
+
+
+def _byte_range(header, length):
+    """Parse a single-range ``Range`` header into ``(start, end)`` inclusive."""
+    match = _RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+    else:
+        start = max(length - int(last), 0)
+        end = length - 1
+    if start > end or start >= length:
+        return "unsatisfiable"
+    return start, end
+
+
+def _make_handler(get_connection):
+    class ImageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self._serve(head=True)
+
+        def do_GET(self):
+            self._serve(head=False)
+
+        def _send_empty(self, status, headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        @metrics.timed("image_server.request")
+        def _serve(self, head):
+            url = urlsplit(self.path)
+            if url.path == HEALTH_PATH:
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(HEALTH_BODY)))
+                self.end_headers()
+                if not head:
+                    self.wfile.write(HEALTH_BODY)
+                return
+            match = _PATH_RE.match(url.path)
+            if not match:
+                return self._send_empty(404)
+            image_id = int(match.group(1))
+            query = parse_qs(url.query)
+            width = None
+            if "w" in query:
+                try:
+                    width = int(query["w"][0])
+                except ValueError:
+                    return self._send_empty(400)
+                if width not in WIDTHS:
+                    return self._send_empty(400)
+            signed = "sig" in query and hmac.compare_digest(query["sig"][0], sign(image_id))
+
+            item = _load(get_connection, image_id, width, signed)
+            if item is None:
+                return self._send_empty(404)
+            etag, body, content_type = item
+            cache_control = PRIVATE_CACHE_CONTROL if signed else PUBLIC_CACHE_CONTROL
+            common = [("ETag", etag), ("Cache-Control", cache_control), ("Accept-Ranges", "bytes")]
+
+            if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+                return self._send_empty(304, common)
+
+            status, start, end = 200, 0, len(body) - 1
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if range_header and (not if_range or if_range.strip() == etag):
+                parsed = _byte_range(range_header, len(body))
+                if parsed == "unsatisfiable":
+                    return self._send_empty(416, common + [("Content-Range", f"bytes */{len(body)}")])
+                if parsed:
+                    status, (start, end) = 206, parsed
+
+            self.send_response(status)
+            for name, value in common:
+                self.send_header(name, value)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(end - start + 1))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            self.end_headers()
+            if not head:
+                self.wfile.write(body[start:end + 1])
+
+    return ImageHandler
+
+
+def _is_peer():
+    """Whether the process holding the port is a TechCar2 image endpoint."""
+    try:
+        with urlopen(f"http://127.0.0.1:{PORT}{HEALTH_PATH}", timeout=2) as response:
+            return response.read() == HEALTH_BODY
+    except (URLError, OSError):
+        return False
+
+
+def start(get_connection):
+    """Start the endpoint once per process; a no-op on later calls.
+
+    Nothing is started without ``TECHCAR_IMAGE_BASE_URL``. When another
+    worker on this host already holds the port, that worker's endpoint
+    serves the same database, so this process just links to it.
+    """
+    global _server
+    if _server is not None:
+        return
+    with _lock:
+        if _server is not None:
+            return
+        if not BASE_URL:
+            _server = False
+            return
+        try:
+            server = ThreadingHTTPServer((HOST, PORT), _make_handler(get_connection))
+        except OSError as error:
+            if _is_peer():
+                _server = PEER
+            else:
+                logger.warning(
+                    "Image endpoint could not bind %s:%s (%s) and no TechCar2 endpoint answers there; "
+                    "serving images inline", HOST, PORT, error
+                )
+                _server = False
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="image-server", daemon=True).start()
+        _server = server
@@ -0,0 +1,282 @@
+"""Per-rerun hot-path instrumentation for TechCar2.
+
+Enable with ``TECHCAR_METRICS=1``. When disabled every helper here hands back
+the original object (or returns immediately), so the app pays nothing.
+"""
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+ENABLED = os.environ.get("TECHCAR_METRICS", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.environ.get("TECHCAR_SLOW_QUERY_MS", "100"))
+PROM_FILE = os.environ.get("TECHCAR_METRICS_FILE", "techcar_metrics.prom")
+PROM_WRITE_INTERVAL = 10.0
+
+_lock = threading.Lock()
+_local = threading.local()
+
+# name -> [calls, total_seconds, max_seconds, rows, bytes]
+_totals = {}
+_recent_reruns = deque(maxlen=200)
+_slow_queries = deque(maxlen=200)
+_last_prom_write = 0.0
+
+
+def _record(name, elapsed, rows=0, nbytes=0):
+    with _lock:
+        stat = _totals.get(name)
+        if stat is None:
+            stat = _totals[name] = [0, 0.0, 0.0, 0, 0]
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+        stat[3] += rows
+        stat[4] += nbytes
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        bucket = rerun["spans"].setdefault(name, [0, 0.0, 0, 0])
+        bucket[0] += 1
+        bucket[1] += elapsed
+        bucket[2] += rows
+        bucket[3] += nbytes
+
+
+def _row_bytes(row):
+    total = 0
+    for value in row:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            total += len(value)
+        elif isinstance(value, str):
+            total += len(value)
+    return total
+
+
+class _TimedCursor:
+    """Cursor proxy recording SQL time, rows fetched and bytes transferred."""
+
+    def __init__(self, cursor, conn):
+        self._cursor = cursor
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        self._cursor.execute(sql, params)
+        elapsed = time.perf_counter() - start
+        _record("sql.execute", elapsed)
+        self._check_slow(sql, params, elapsed)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        self._cursor.executemany(sql, seq_of_params)
+        _record("sql.executemany", time.perf_counter() - start)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        rows, nbytes = (1, _row_bytes(row)) if row is not None else (0, 0)
+        _record("sql.fetch", time.perf_counter() - start, rows, nbytes)
+        return row
+
+    def fetchall(self):
+        start = time.perf_counter()
+        result = self._cursor.fetchall()
+        nbytes = sum(_row_bytes(row) for row in result)
+        _record("sql.fetch", time.perf_counter() - start, len(result), nbytes)
+        return result
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        result = self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+        nbytes = sum(_row_bytes(row) for row in result)
+        _record("sql.fetch", time.perf_counter() - start, len(result), nbytes)
+        return result
+
+    def _check_slow(self, sql, params, elapsed):
+        if elapsed * 1000 < SLOW_QUERY_MS:
+            return
+        plan = []
+        if sql.lstrip().upper().startswith("SELECT"):
+            try:
+                plan = [
+                    row[-1] for row in
+                    self._conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                ]
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+        with _lock:
+            _slow_queries.append({
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "ms": round(elapsed * 1000, 2),
+                "sql": " ".join(sql.split()),
+                "params": repr(tuple(params))[:200],
+                "plan": plan,
+            })
+
+
+class _TimedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def cursor(self):
+        return _TimedCursor(self._conn.cursor(), self._conn)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        start = time.perf_counter()
+        self._conn.commit()
+        _record("sql.commit", time.perf_counter() - start)
+
+
+def wrap_connection_factory(factory):
+    """Return ``factory`` itself when disabled, else one yielding timed connections."""
+    if not ENABLED:
+        return factory
+
+    @wraps(factory)
+    def instrumented(*args, **kwargs):
+        start = time.perf_counter()
+        conn = factory(*args, **kwargs)
+        _record("sql.connect", time.perf_counter() - start)
+        return _TimedConnection(conn)
+
+    return instrumented
+
+
+def timed(name):
+    """Decorator timing each call under ``name``; a no-op when disabled."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def start_rerun():
+    if not ENABLED:
+        return None
+    _local.rerun = {"start": time.perf_counter(), "spans": {}}
+    return _local.rerun
+
+
+def finish_rerun(rerun, page):
+    """Close the rerun opened by :func:`start_rerun` and attribute it to ``page``."""
+    if rerun is None:
+        return
+    _local.rerun = None
+    elapsed = time.perf_counter() - rerun["start"]
+    _record(f"page.{page}", elapsed)
+    with _lock:
+        _recent_reruns.append({
+            "at": time.strftime("%H:%M:%S"),
+            "page": page,
+            "ms": round(elapsed * 1000, 2),
+            "spans": {
+                name: {"calls": b[0], "ms": round(b[1] * 1000, 2), "rows": b[2], "bytes": b[3]}
+                for name, b in rerun["spans"].items()
+            },
+        })
+    _maybe_write_prometheus()
+
+
+def snapshot():
+    """Copy of the current counters for the admin metrics view."""
+    with _lock:
+        totals = {
+            name: {
+                "calls": s[0],
+                "total_ms": round(s[1] * 1000, 2),
+                "avg_ms": round(s[1] * 1000 / s[0], 3) if s[0] else 0.0,
+                "max_ms": round(s[2] * 1000, 2),
+                "rows": s[3],
+                "bytes": s[4],
+            }
+            for name, s in _totals.items()
+        }
+        return totals, list(_recent_reruns), list(_slow_queries)
+
+
+# (metric, type, help, index into the _totals entry, format)
+PROM_FAMILIES = (
+    ("techcar_span_calls_total", "counter", "Calls per instrumented span.", 0, "{}"),
+    ("techcar_span_seconds_total", "counter", "Seconds spent per instrumented span.", 1, "{:.6f}"),
+    ("techcar_span_seconds_max", "gauge", "Slowest single call per span.", 2, "{:.6f}"),
+    ("techcar_span_rows_total", "counter", "Rows fetched per span.", 3, "{}"),
+    ("techcar_span_bytes_total", "counter", "Bytes fetched per span.", 4, "{}"),
+)
+
+
+def prometheus_text():
+    """Counters in the Prometheus text format, one contiguous block per metric family."""
+    with _lock:
+        items = sorted((name, list(s)) for name, s in _totals.items())
+        slow = len(_slow_queries)
+    lines = []
+    for metric, kind, help_text, field, fmt in PROM_FAMILIES:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, stat in items:
+            lines.append(f'{metric}{{span="{name}"}} {fmt.format(stat[field])}')
+    lines.append("# HELP techcar_slow_queries Slow queries currently in the log.")
+    lines.append("# TYPE techcar_slow_queries gauge")
+    lines.append(f"techcar_slow_queries {slow}")
+    return "\n".join(lines) + "\n"
+
+
+def _maybe_write_prometheus():
+    global _last_prom_write
+    now = time.monotonic()
+    if now - _last_prom_write < PROM_WRITE_INTERVAL:
+        return
+    _last_prom_write = now
+    tmp_path = f"{PROM_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, PROM_FILE)
+    except OSError:
+        pass
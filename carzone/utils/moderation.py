@@ -0,0 +1,77 @@
+"""Database helpers for the admin moderation queue."""
+
+# When each car was approved or rejected; cars carry only their submission
+# time, and archival ages rejections from the decision.
+DECISIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS moderation_decisions (
+    car_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    decided_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+PENDING_CONDITION = "(c.status IS NULL OR c.status NOT IN ('approved', 'rejected'))"
+PENDING_UPDATE_CONDITION = "(status IS NULL OR status NOT IN ('approved', 'rejected'))"
+DECISIONS = ('approved', 'rejected')
+
+
+def pending_ids(cursor):
+    """Ids of pending cars in review order, newest first."""
+    cursor.execute(f"SELECT c.id FROM cars c WHERE {PENDING_CONDITION} ORDER BY c.created_at DESC")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_review_car(cursor, car_id):
+    """The pending car ``car_id`` with seller details, or None once decided."""
+    cursor.execute(f"""
+        SELECT
+            c.*,
+            s.email as seller_email,
+            s.phone as seller_phone,
+            s.state as seller_state,
+            s.city as seller_city,
+            s.created_at as seller_created_at
+        FROM cars c
+        JOIN sellers s ON c.seller_id = s.id
+        WHERE c.id = ? AND {PENDING_CONDITION}
+    """, (car_id,))
+    return cursor.fetchone()
+
+
+def ensure_tables(conn):
+    # A single DDL statement: no implicit commit of the caller's transaction
+    conn.execute(DECISIONS_SCHEMA)
+
+
+def apply_decisions(conn, car_ids, status):
+    """Set ``status`` on every still-pending car in ``car_ids`` in one transaction.
+
+    Returns the number of cars updated; cars another admin already decided
+    are left alone. Each decision is timestamped in ``moderation_decisions``.
+    """
+    if status not in DECISIONS:
+        raise ValueError(f"Unknown moderation status: {status}")
+    car_ids = list(car_ids)
+    if not car_ids:
+        return 0
+    ensure_tables(conn)
+    cursor = conn.cursor()
+    try:
+        if not conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        decided = []
+        for car_id in car_ids:
+            cursor.execute(
+                f"UPDATE cars SET status = ? WHERE id = ? AND {PENDING_UPDATE_CONDITION}", (status, car_id)
+            )
+            if cursor.rowcount:
+                decided.append((car_id, status))
+        cursor.executemany(
+            "INSERT OR REPLACE INTO moderation_decisions (car_id, status) VALUES (?, ?)", decided
+        )
+        updated = len(decided)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return updated
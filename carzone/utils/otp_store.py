@@ -0,0 +1,178 @@
+"""Bounded, expiring OTP bookkeeping in front of ``otp_sender``.
+
+Each email maps to one compact record (expiry, failed attempts, lockout) in a
+dict, so lookups are O(1). A min-heap keyed on expiry lets the sweeper drop
+stale records without scanning, and a hard cap keeps memory bounded.
+Verification is only forwarded to ``verify_otp`` while a live, unlocked
+record exists, so expired or brute-forced emails are rejected immediately.
+
+Failed attempts and sends are counted per email over a window as long as
+the lockout, and a resend does not clear them: guessing, requesting a new
+code and guessing again still runs into the lockout, and at most
+``MAX_SENDS`` codes go out per window. A record is kept until its window
+ends, so the counts survive the code expiring.
+"""
+import heapq
+import os
+import threading
+import time
+
+OTP_TTL = float(os.environ.get("TECHCAR_OTP_TTL", "600"))
+MAX_ATTEMPTS = int(os.environ.get("TECHCAR_OTP_MAX_ATTEMPTS", "5"))
+LOCKOUT_SECONDS = float(os.environ.get("TECHCAR_OTP_LOCKOUT", "900"))
+MAX_SENDS = int(os.environ.get("TECHCAR_OTP_MAX_SENDS", "5"))
+MAX_ENTRIES = int(os.environ.get("TECHCAR_OTP_MAX_ENTRIES", "100000"))
+SWEEP_INTERVAL = 30.0
+
+
+class _Record:
+    __slots__ = ("expires_at", "attempts", "locked_until", "sends", "window_ends")
+
+    def __init__(self, expires_at, window_ends):
+        self.expires_at = expires_at
+        self.attempts = 0
+        self.locked_until = 0.0
+        self.sends = 0
+        self.window_ends = window_ends
+
+    def deadline(self):
+        return max(self.expires_at, self.locked_until, self.window_ends)
+
+    def roll_window(self, now, window):
+        """Forget failures and sends once the counting window has passed; True if it did."""
+        if self.window_ends > now:
+            return False
+        self.attempts = 0
+        self.sends = 0
+        self.window_ends = now + window
+        return True
+
+
+class OTPStore:
+    def __init__(self, ttl=OTP_TTL, max_attempts=MAX_ATTEMPTS, lockout=LOCKOUT_SECONDS,
+                 max_sends=MAX_SENDS, max_entries=MAX_ENTRIES, sweep_interval=SWEEP_INTERVAL,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.lockout = lockout
+        self.max_sends = max_sends
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._records = {}
+        # (deadline, email); entries go stale when a record is refreshed and
+        # are skipped when popped.
+        self._expiry = []
+        self._next_sweep = 0.0
+
+    def __len__(self):
+        return len(self._records)
+
+    @staticmethod
+    def _key(email):
+        return email.strip().lower()
+
+    def _push(self, email, record):
+        heapq.heappush(self._expiry, (record.deadline(), email))
+
+    def _sweep(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            deadline, email = heapq.heappop(self._expiry)
+            record = self._records.get(email)
+            if record is not None and record.deadline() <= now:
+                del self._records[email]
+        # Refreshed records leave stale heap entries behind; rebuild once
+        # they dominate so the heap stays proportional to live records.
+        if len(self._expiry) > 2 * len(self._records) + 64:
+            self._expiry = [(r.deadline(), e) for e, r in self._records.items()]
+            heapq.heapify(self._expiry)
+        self._next_sweep = now + self.sweep_interval
+
+    def _maybe_sweep(self, now):
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+    def _evict_one(self):
+        while self._expiry:
+            deadline, email = heapq.heappop(self._expiry)
+            record = self._records.get(email)
+            if record is not None and record.deadline() == deadline:
+                del self._records[email]
+                return
+
+    def sweep(self):
+        with self._lock:
+            self._sweep(self._clock())
+
+    def send(self, email, deliver):
+        """Deliver an OTP via ``deliver(email)`` unless the email is locked out or over its send limit."""
+        key = self._key(email)
+        with self._lock:
+            now = self._clock()
+            self._maybe_sweep(now)
+            record = self._records.get(key)
+            if record is not None and record.locked_until > now:
+                minutes = int((record.locked_until - now) // 60) + 1
+                return False, f"Too many incorrect attempts. Try again in {minutes} minute(s)."
+            if record is not None and record.window_ends > now and record.sends >= self.max_sends:
+                minutes = int((record.window_ends - now) // 60) + 1
+                return False, f"Too many OTP requests. Try again in {minutes} minute(s)."
+        success, message = deliver(email)
+        if not success:
+            return success, message
+        with self._lock:
+            now = self._clock()
+            record = self._records.get(key)
+            if record is None:
+                if len(self._records) >= self.max_entries:
+                    self._sweep(now)
+                    if len(self._records) >= self.max_entries:
+                        self._evict_one()
+                record = self._records[key] = _Record(now + self.ttl, now + self.lockout)
+            else:
+                # Failed attempts carry over to the new code
+                record.roll_window(now, self.lockout)
+                record.expires_at = now + self.ttl
+            record.sends += 1
+            self._push(key, record)
+        return success, message
+
+    def verify(self, email, otp, check):
+        """Verify ``otp`` via ``check(email, otp)`` within the TTL and attempt budget."""
+        key = self._key(email)
+        with self._lock:
+            now = self._clock()
+            self._maybe_sweep(now)
+            record = self._records.get(key)
+            if record is not None and record.locked_until > now:
+                minutes = int((record.locked_until - now) // 60) + 1
+                return False, f"Too many incorrect attempts. Try again in {minutes} minute(s)."
+            if record is None or record.expires_at <= now:
+                # The record stays until its window ends, keeping its counts
+                return False, "OTP expired or not requested. Please request a new OTP."
+            if record.roll_window(now, self.lockout):
+                self._push(key, record)
+            # Count the attempt before releasing the lock so concurrent
+            # guesses cannot exceed the budget.
+            if record.attempts >= self.max_attempts:
+                return False, "Too many incorrect attempts. Please request a new OTP later."
+            record.attempts += 1
+            attempts = record.attempts
+        success, message = check(email, otp)
+        with self._lock:
+            record = self._records.get(key)
+            if success:
+                self._records.pop(key, None)
+            elif record is not None and attempts >= self.max_attempts:
+                now = self._clock()
+                record.expires_at = now
+                record.locked_until = now + self.lockout
+                # Counts start afresh once the lockout is over
+                record.window_ends = record.locked_until
+                self._push(key, record)
+                message = "Too many incorrect attempts. Please request a new OTP later."
+        return success, message
+
+
+store = OTPStore()
@@ -0,0 +1,335 @@
+"""Saved Buy-page searches, matched incrementally when cars are approved.
+
+Instead of re-running every saved query, each approved car is matched
+against an in-memory index:
+
+* an inverted index from ``(attribute, value)`` to the searches that require
+  it, with a per-search count of equality constraints, so a search matches
+  when all of its constraints were hit;
+* a centered interval tree over the price ranges of searches that have no
+  equality constraints (the only ones the inverted index cannot narrow).
+
+Work per approval is proportional to the postings touched plus the matches,
+not to the number of saved searches.
+"""
+import json
+import threading
+from bisect import bisect_right
+
+EQ_ATTRIBUTES = ('maker', 'model', 'fuel_type', 'transmission', 'state', 'city')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saved_searches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL,
+    filters TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_saved_searches_email ON saved_searches(email);
+CREATE TABLE IF NOT EXISTS search_notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    search_id INTEGER NOT NULL,
+    car_id INTEGER NOT NULL,
+    seen INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (search_id, car_id)
+);
+"""
+
+
+def _price_range(filters):
+    # Same semantics as get_car_listings: a missing or zero bound is no bound
+    low = filters.get('min_price')
+    high = filters.get('max_price')
+    return (
+        float(low) if low else float('-inf'),
+        float(high) if high else float('inf'),
+    )
+
+
+class _IntervalNode:
+    __slots__ = ("center", "by_low", "lows", "by_high", "highs", "left", "right")
+
+
+class IntervalTree:
+    """Static centered interval tree answering stabbing queries.
+
+    Rebuilt lazily after changes; it only holds searches without equality
+    constraints, which change rarely compared to how often cars are approved.
+    """
+
+    def __init__(self):
+        self._intervals = {}
+        self._root = None
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, key, low, high):
+        self._intervals[key] = (low, high)
+        self._dirty = True
+
+    def discard(self, key):
+        if self._intervals.pop(key, None) is not None:
+            self._dirty = True
+
+    @classmethod
+    def _build(cls, items):
+        if not items:
+            return None
+        endpoints = sorted(
+            value for _, (low, high) in items for value in (low, high) if value not in (float('-inf'), float('inf'))
+        )
+        center = endpoints[len(endpoints) // 2] if endpoints else 0.0
+        left, right, here = [], [], []
+        for item in items:
+            low, high = item[1]
+            if high < center:
+                left.append(item)
+            elif low > center:
+                right.append(item)
+            else:
+                here.append(item)
+        node = _IntervalNode()
+        node.center = center
+        node.by_low = sorted(here, key=lambda item: item[1][0])
+        node.lows = [item[1][0] for item in node.by_low]
+        node.by_high = sorted(here, key=lambda item: -item[1][1])
+        node.highs = [-item[1][1] for item in node.by_high]
+        node.left = cls._build(left)
+        node.right = cls._build(right)
+        return node
+
+    def stab(self, point):
+        """Keys of all intervals containing ``point``."""
+        if self._dirty:
+            self._root = self._build(list(self._intervals.items()))
+            self._dirty = False
+        found = []
+        node = self._root
+        while node is not None:
+            # Every interval stored at a node contains its center
+            if point < node.center:
+                stop = bisect_right(node.lows, point)
+                found.extend(key for key, _ in node.by_low[:stop])
+                node = node.left
+            elif point > node.center:
+                stop = bisect_right(node.highs, -point)
+                found.extend(key for key, _ in node.by_high[:stop])
+                node = node.right
+            else:
+                found.extend(key for key, _ in node.by_low)
+                break
+        return found
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings = {}
+        self._keys = {}
+        self._prices = {}
+        self._price_only = IntervalTree()
+        self.last_id = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, search_id, filters):
+        self.remove(search_id)
+        keys = tuple(
+            (attribute, filters[attribute]) for attribute in EQ_ATTRIBUTES if filters.get(attribute)
+        )
+        for key in keys:
+            self._postings.setdefault(key, set()).add(search_id)
+        self._keys[search_id] = keys
+        low, high = _price_range(filters)
+        if keys:
+            self._prices[search_id] = (low, high)
+        elif low <= high:
+            # An inverted range never matches, so it stays out of the tree
+            self._price_only.add(search_id, low, high)
+
+    def remove(self, search_id):
+        keys = self._keys.pop(search_id, None)
+        if keys is None:
+            return
+        self._prices.pop(search_id, None)
+        self._price_only.discard(search_id)
+        for key in keys:
+            self._postings[key].discard(search_id)
+            if not self._postings[key]:
+                del self._postings[key]
+
+    def match(self, car):
+        """Ids of saved searches the car (a mapping of EQ_ATTRIBUTES and price) satisfies."""
+        price = float(car['price'] or 0)
+        counts = {}
+        for attribute in EQ_ATTRIBUTES:
+            for search_id in self._postings.get((attribute, car[attribute]), ()):
+                counts[search_id] = counts.get(search_id, 0) + 1
+        matched = set(self._price_only.stab(price))
+        for search_id, count in counts.items():
+            if count == len(self._keys[search_id]):
+                low, high = self._prices[search_id]
+                if low <= price <= high:
+                    matched.add(search_id)
+        return matched
+
+
+_lock = threading.Lock()
+_index = None
+_tables_ready = False
+
+
+def ensure_tables(conn):
+    """Create the tables once per process; later calls cost nothing."""
+    global _tables_ready
+    if not _tables_ready:
+        conn.executescript(SCHEMA)
+        conn.commit()
+        _tables_ready = True
+
+
+def _load_new(conn, index):
+    """Add searches saved by any process since this index was last synced.
+
+    ``last_id`` only advances over rows read here, so a search another
+    worker saved concurrently is never skipped.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, filters FROM saved_searches WHERE id > ? ORDER BY id", (index.last_id,))
+    for search_id, filters in cursor.fetchall():
+        index.add(search_id, json.loads(filters))
+        index.last_id = search_id
+
+
+def _get_index(conn):
+    global _index
+    if _index is None:
+        ensure_tables(conn)
+        _index = SearchIndex()
+    _load_new(conn, _index)
+    return _index
+
+
+def save(get_connection, email, filters):
+    """Persist a search built from the Buy page's filter dict; returns its id."""
+    filters = {key: value for key, value in filters.items() if value}
+    conn = get_connection()
+    try:
+        with _lock:
+            index = _get_index(conn)
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO saved_searches (email, filters) VALUES (?, ?)",
+                (email.strip().lower(), json.dumps(filters, sort_keys=True))
+            )
+            search_id = cursor.lastrowid
+            conn.commit()
+            _load_new(conn, index)
+    finally:
+        conn.close()
+    return search_id
+
+
+def delete(get_connection, email, search_id):
+    conn = get_connection()
+    try:
+        with _lock:
+            index = _get_index(conn)
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM saved_searches WHERE id = ? AND email = ?", (search_id, email.strip().lower())
+            )
+            if cursor.rowcount:
+                cursor.execute("DELETE FROM search_notifications WHERE search_id = ?", (search_id,))
+                index.remove(search_id)
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def list_for(get_connection, email):
+    """``(id, filters, unseen_matches)`` for each search saved by ``email``."""
+    conn = get_connection()
+    try:
+        ensure_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT ss.id, ss.filters,
+                (SELECT COUNT(*) FROM search_notifications sn WHERE sn.search_id = ss.id AND sn.seen = 0)
+            FROM saved_searches ss
+            WHERE ss.email = ?
+            ORDER BY ss.id
+        """, (email.strip().lower(),))
+        return [(row[0], json.loads(row[1]), row[2]) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def unseen_matches(get_connection, email):
+    """Approved cars newly matching ``email``'s searches, newest first."""
+    conn = get_connection()
+    try:
+        ensure_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT c.id, c.maker, c.model, c.year, c.price, c.city, c.state
+            FROM search_notifications sn
+            JOIN saved_searches ss ON sn.search_id = ss.id
+            JOIN cars c ON sn.car_id = c.id
+            WHERE ss.email = ? AND sn.seen = 0 AND c.status = 'approved'
+            ORDER BY sn.created_at DESC
+        """, (email.strip().lower(),))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def mark_seen(get_connection, email):
+    conn = get_connection()
+    try:
+        ensure_tables(conn)
+        conn.execute("""
+            UPDATE search_notifications SET seen = 1
+            WHERE seen = 0 AND search_id IN (SELECT id FROM saved_searches WHERE email = ?)
+        """, (email.strip().lower(),))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def notify_matches(get_connection, car_ids):
+    """Record notifications for every saved search the newly approved cars match."""
+    car_ids = list(car_ids)
+    if not car_ids:
+        return 0
+    conn = get_connection()
+    try:
+        with _lock:
+            index = _get_index(conn)
+            if not len(index):
+                return 0
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT id, {', '.join(EQ_ATTRIBUTES)}, price FROM cars
+                WHERE status = 'approved' AND id IN ({', '.join('?' * len(car_ids))})
+                """,
+                car_ids
+            )
+            columns = ('id',) + EQ_ATTRIBUTES + ('price',)
+            cars = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            pairs = [(search_id, car['id']) for car in cars for search_id in index.match(car)]
+        if pairs:
+            # The sub-select skips searches another process deleted meanwhile
+            cursor.executemany(
+                "INSERT OR IGNORE INTO search_notifications (search_id, car_id) "
+                "SELECT id, ? FROM saved_searches WHERE id = ?",
+                [(car_id, search_id) for search_id, car_id in pairs]
+            )
+            conn.commit()
+        return len(pairs)
+    finally:
+        conn.close()
@@ -0,0 +1,229 @@
+"""Cache shared by every Streamlit worker on a host.
+
+Listing results, image derivatives and price estimates are stored in one
+SQLite file (WAL mode, so readers never block the writer), next to the live
+database by default. The file is bounded by ``TECHCAR_SHARED_CACHE_BYTES``.
+When a write pushes it over, the least recently used entries are evicted.
+``last_access`` is only refreshed once per ``TOUCH_INTERVAL``, so hits stay
+read-only most of the time.
+
+Entries that depend on the ``cars`` table are stored with a generation
+number. Triggers installed in the live database bump the generation when an
+approved car is inserted, updated or deleted, or a car enters or leaves the
+approved state. Pending Sell submissions never show on the Buy page, so they
+leave cached listings (and the Buy snapshot) alone. An entry read back under
+a different generation is a miss; only entries older than the reader's
+generation are deleted, so workers whose snapshots differ in age do not
+delete each other's entries.
+
+Values are plain data (listing dicts, ``(etag, bytes, content_type)``
+tuples, floats) and are stored with ``marshal``, which only rebuilds builtin
+types; unlike pickle, whoever can write the file cannot make a worker run
+code by planting an entry.
+
+The cache is best effort: a busy or locked cache file or an entry that does
+not decode counts as a miss, and a write to it is skipped instead of failing
+the request. So is a value ``marshal`` cannot store.
+"""
+import hashlib
+import marshal
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+ENABLED = os.environ.get("TECHCAR_SHARED_CACHE", "1") not in ("0", "false", "")
+MAX_BYTES = int(os.environ.get("TECHCAR_SHARED_CACHE_BYTES", str(256 * 1024 * 1024)))
+TOUCH_INTERVAL = 60.0
+# Evict down to this fraction of MAX_BYTES, so eviction runs in batches
+EVICT_TO = 0.9
+
+MISS = object()
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 1), size INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals (id, size) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS entries_size_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_size_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET size = size + new.size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_size_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET size = size - old.size;
+END;
+"""
+
+# Installed in the live database
+GENERATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_generation (id INTEGER PRIMARY KEY CHECK (id = 1), generation INTEGER NOT NULL);
+INSERT OR IGNORE INTO cache_generation (id, generation) VALUES (1, 1);
+DROP TRIGGER IF EXISTS cars_generation_insert;
+DROP TRIGGER IF EXISTS cars_generation_update;
+DROP TRIGGER IF EXISTS cars_generation_delete;
+CREATE TRIGGER IF NOT EXISTS cars_generation_approved_insert AFTER INSERT ON cars
+WHEN new.status = 'approved' BEGIN
+    UPDATE cache_generation SET generation = generation + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cars_generation_approved_update AFTER UPDATE ON cars
+WHEN new.status = 'approved' OR old.status = 'approved' BEGIN
+    UPDATE cache_generation SET generation = generation + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cars_generation_approved_delete AFTER DELETE ON cars
+WHEN old.status = 'approved' BEGIN
+    UPDATE cache_generation SET generation = generation + 1;
+END;
+"""
+
+_lock = threading.Lock()
+_local = threading.local()
+_path = None
+
+
+def cache_path(live_path):
+    return os.environ.get("TECHCAR_SHARED_CACHE_PATH") or f"{live_path}.cache.db"
+
+
+def install(get_connection):
+    """Set up the cache file and the live generation triggers; once per process."""
+    global _path
+    if not ENABLED or _path is not None:
+        return
+    with _lock:
+        if _path is not None:
+            return
+        conn = get_connection()
+        try:
+            live_path = conn.execute("PRAGMA database_list").fetchone()[2]
+            if not live_path:
+                # In-memory databases are private to one process
+                _path = ""
+                return
+            conn.executescript(GENERATION_SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+        path = cache_path(live_path)
+        cache = sqlite3.connect(path, timeout=5)
+        try:
+            cache.execute("PRAGMA journal_mode=WAL")
+            cache.executescript(CACHE_SCHEMA)
+            cache.commit()
+        finally:
+            cache.close()
+        _path = path
+
+
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != _path:
+        conn = sqlite3.connect(_path, timeout=0.5, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn, _local.path = conn, _path
+    return conn
+
+
+def _digest(namespace, key):
+    return f"{namespace}:{hashlib.sha1(repr(key).encode()).hexdigest()}"
+
+
+def get(namespace, key, generation=0):
+    """The cached value, or ``MISS``."""
+    if not _path:
+        return MISS
+    digest = _digest(namespace, key)
+    try:
+        conn = _connection()
+        row = conn.execute(
+            "SELECT generation, value, last_access FROM entries WHERE key = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return MISS
+        if row[0] != generation:
+            if row[0] < generation:
+                conn.execute("DELETE FROM entries WHERE key = ? AND generation = ?", (digest, row[0]))
+                conn.commit()
+            # A newer entry belongs to a worker with a fresher snapshot
+            return MISS
+        try:
+            value = marshal.loads(row[1])
+        except (ValueError, EOFError, TypeError):
+            conn.execute("DELETE FROM entries WHERE key = ?", (digest,))
+            conn.commit()
+            return MISS
+        now = time.time()
+        if now - row[2] >= TOUCH_INTERVAL:
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, digest))
+            conn.commit()
+        return value
+    except sqlite3.OperationalError:
+        return MISS
+
+
+def put(namespace, key, value, generation=0):
+    if not _path:
+        return
+    try:
+        data = marshal.dumps(value)
+    except ValueError:
+        # Not plain data (e.g. a numpy scalar); leave it uncached
+        return
+    if len(data) > MAX_BYTES * (1 - EVICT_TO):
+        return
+    conn = None
+    try:
+        conn = _connection()
+        conn.execute(
+            """
+            INSERT INTO entries (key, namespace, generation, value, size, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                generation = excluded.generation, value = excluded.value,
+                size = excluded.size, last_access = excluded.last_access
+            WHERE excluded.generation >= entries.generation
+            """,
+            (_digest(namespace, key), namespace, generation, data, len(data), time.time())
+        )
+        total = conn.execute("SELECT size FROM totals").fetchone()[0]
+        if total > MAX_BYTES:
+            while total > MAX_BYTES * EVICT_TO:
+                evicted = conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT 64)"
+                ).rowcount
+                if not evicted:
+                    break
+                total = conn.execute("SELECT size FROM totals").fetchone()[0]
+        conn.commit()
+    except sqlite3.OperationalError:
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+
+def memoize(namespace):
+    """Cache a pure function's results across processes, keyed by its arguments."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            value = get(namespace, key)
+            if value is MISS:
+                value = func(*args, **kwargs)
+                put(namespace, key, value)
+            return value
+
+        return wrapper
+
+    return decorator
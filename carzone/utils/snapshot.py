@@ -0,0 +1,186 @@
+"""Read-only snapshot of approved listings for the Buy page.
+
+Buyer reads used to run against the live database, contending with Sell
+BLOB inserts and admin updates. Instead, a background thread periodically
+copies approved cars (with seller contact columns and the ids of their
+images, but no BLOBs) into a separate file and swaps it in with
+``os.replace``. Readers open it with ``mode=ro&immutable=1``, so they take
+no locks at all; a reader that opened the previous file keeps reading it
+until it closes.
+
+Each snapshot records the live ``cache_generation`` it was built from (see
+``shared_cache``), read before the copy so it never claims newer data than
+it holds. The refresher compares it with the live value and skips the copy
+when no car has changed.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+REFRESH_INTERVAL = float(os.environ.get("TECHCAR_SNAPSHOT_INTERVAL", "30"))
+POLL_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_live_path = None
+_refresher = None
+
+BUILD_SQL = """
+CREATE TABLE listings AS
+SELECT
+    c.*,
+    s.email AS seller_email,
+    s.phone AS seller_phone,
+    s.state AS seller_state,
+    s.city AS seller_city,
+    (
+        SELECT group_concat(id)
+        FROM (SELECT id FROM live.car_images WHERE car_id = c.id ORDER BY id)
+    ) AS image_ids
+FROM live.cars c
+JOIN live.sellers s ON c.seller_id = s.id
+WHERE c.status = 'approved';
+CREATE INDEX idx_listings_maker_model ON listings(maker, model);
+CREATE INDEX idx_listings_state_city ON listings(state, city);
+CREATE INDEX idx_listings_price ON listings(price);
+CREATE INDEX idx_listings_created_at ON listings(created_at);
+"""
+
+
+def _uri(path, **params):
+    query = "&".join(f"{key}={value}" for key, value in params.items())
+    return f"file:{quote(os.path.abspath(path))}?{query}"
+
+
+def snapshot_path(live_path):
+    return os.environ.get("TECHCAR_SNAPSHOT_PATH") or f"{live_path}.buy-snapshot.db"
+
+
+def _resolve_live_path(get_connection):
+    global _live_path
+    if _live_path is None:
+        conn = get_connection()
+        try:
+            path = conn.execute("PRAGMA database_list").fetchone()[2]
+        finally:
+            conn.close()
+        if not path:
+            raise RuntimeError("Buy snapshot requires a file-backed database")
+        _live_path = path
+    return _live_path
+
+
+def refresh(live_path):
+    """Rebuild the snapshot for ``live_path`` and atomically swap it in."""
+    target = snapshot_path(live_path)
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path, uri=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS live", (_uri(live_path, mode="ro"),))
+        conn.execute("CREATE TABLE snapshot_meta (generation INTEGER)")
+        has_generation = conn.execute(
+            "SELECT 1 FROM live.sqlite_master WHERE type = 'table' AND name = 'cache_generation'"
+        ).fetchone()
+        if has_generation:
+            conn.execute("INSERT INTO snapshot_meta SELECT generation FROM live.cache_generation")
+        else:
+            conn.execute("INSERT INTO snapshot_meta VALUES (NULL)")
+        conn.executescript(BUILD_SQL)
+        conn.commit()
+        conn.execute("DETACH DATABASE live")
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, target)
+
+
+def _is_stale(path):
+    try:
+        return time.time() - os.path.getmtime(path) >= REFRESH_INTERVAL
+    except FileNotFoundError:
+        return True
+
+
+def _is_current(live_path, path):
+    """Whether the snapshot was built from the live ``cache_generation``."""
+    live = sqlite3.connect(_uri(live_path, mode="ro"), uri=True)
+    try:
+        row = live.execute(
+            "SELECT generation FROM cache_generation WHERE id = 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # No generation triggers installed; only a rebuild can tell
+        return False
+    finally:
+        live.close()
+    snapshot = sqlite3.connect(_uri(path, mode="ro", immutable=1), uri=True)
+    try:
+        built_from = generation(snapshot)
+    finally:
+        snapshot.close()
+    return row is not None and built_from is not None and row[0] == built_from
+
+
+def _refresh_loop(live_path):
+    path = snapshot_path(live_path)
+    while True:
+        time.sleep(POLL_INTERVAL)
+        if _is_stale(path):
+            try:
+                if os.path.exists(path) and _is_current(live_path, path):
+                    # No car changed since the last build; push the next
+                    # check out by an interval instead of copying every row.
+                    os.utime(path)
+                else:
+                    refresh(live_path)
+            except (sqlite3.Error, OSError) as error:
+                # The live database may be busy or mid-migration, or the
+                # swap failed; keep serving the previous snapshot and retry
+                # on the next poll.
+                logger.warning("Buy snapshot refresh failed, serving the previous one: %r", error)
+
+
+def connect(get_connection):
+    """Open the current snapshot read-only, building it on first use."""
+    global _refresher
+    live_path = _resolve_live_path(get_connection)
+    path = snapshot_path(live_path)
+    if not os.path.exists(path) or _refresher is None:
+        with _lock:
+            if not os.path.exists(path):
+                refresh(live_path)
+            if _refresher is None:
+                _refresher = threading.Thread(
+                    target=_refresh_loop, args=(live_path,), name="buy-snapshot-refresher", daemon=True
+                )
+                _refresher.start()
+    conn = sqlite3.connect(_uri(path, mode="ro", immutable=1), uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def generation(conn):
+    """Live cache generation the open snapshot was built from, or None."""
+    try:
+        row = conn.execute("SELECT generation FROM snapshot_meta").fetchone()
+    except sqlite3.OperationalError:
+        # Built before generations existed
+        return None
+    return row[0] if row else None
+
+
+def invalidate(get_connection):
+    """Mark the snapshot stale so every process rebuilds it on its next poll."""
+    path = snapshot_path(_resolve_live_path(get_connection))
+    try:
+        os.utime(path, (0, 0))
+    except FileNotFoundError:
+        pass
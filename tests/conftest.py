@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Same import setup as TechCar2.py: the repo root holds the carzone package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
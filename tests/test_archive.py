@@ -0,0 +1,112 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from carzone.utils import archive
+
+SCHEMA = """
+CREATE TABLE cars (id INTEGER PRIMARY KEY AUTOINCREMENT, seller_id INTEGER, maker TEXT, status TEXT,
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE car_images (id INTEGER PRIMARY KEY AUTOINCREMENT, car_id INTEGER, image_data BLOB);
+CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, car_id INTEGER, document_type TEXT,
+                        document_data BLOB);
+CREATE TABLE buyer_inquiries (id INTEGER PRIMARY KEY AUTOINCREMENT, car_id INTEGER, email TEXT, status TEXT,
+                              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE moderation_decisions (car_id INTEGER PRIMARY KEY, status TEXT NOT NULL,
+                                   decided_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+"""
+
+NOW = datetime(2024, 6, 1)
+
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    monkeypatch.setenv("TECHCAR_ARCHIVE_DIR", str(tmp_path / "archive"))
+    path = str(tmp_path / "live.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO cars VALUES (?, 7, ?, ?, ?)", [
+        # Rejected long ago: archived
+        (1, 'Tata', 'rejected', '2023-03-01 10:00:00'),
+        # Submitted long ago but only rejected last week: kept
+        (2, 'Maruti', 'rejected', '2023-04-01 10:00:00'),
+        (3, 'Hyundai', 'approved', '2022-01-01 10:00:00'),
+    ])
+    conn.executemany("INSERT INTO moderation_decisions VALUES (?, 'rejected', ?)", [
+        (1, '2023-03-02 10:00:00'), (2, '2024-05-25 10:00:00'),
+    ])
+    conn.execute("INSERT INTO car_images (car_id, image_data) VALUES (1, ?)", (b"jpeg",))
+    conn.execute("INSERT INTO documents (car_id, document_type, document_data) VALUES (1, 'rc_book', ?)", (b"pdf",))
+    conn.executemany("INSERT INTO buyer_inquiries VALUES (?, ?, ?, 'contacted', ?)", [
+        (1, 1, 'a@x.com', '2023-03-05 10:00:00'),
+        # Old contacted inquiry on a live car: archived on its own
+        (2, 3, 'b@x.com', '2022-02-01 10:00:00'),
+        (3, 3, 'c@x.com', '2024-05-30 10:00:00'),
+    ])
+    conn.commit()
+    conn.close()
+    return lambda: sqlite3.connect(path)
+
+
+def ids(get_connection, table):
+    conn = get_connection()
+    try:
+        return [row[0] for row in conn.execute(f"SELECT id FROM {table} ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_round_trip(live):
+    assert archive.run(live, now=NOW) == (1, 1)
+    assert ids(live, "cars") == [2, 3]
+    assert ids(live, "car_images") == []
+    assert ids(live, "documents") == []
+    assert ids(live, "buyer_inquiries") == [3]
+
+    cars = archive.find_cars(live, car_id=1)
+    assert [(car['id'], car['archive']) for car in cars] == [(1, "archive_2023.db")]
+    assert cars[0]['images'] == [b"jpeg"]
+    assert cars[0]['documents'] == {'rc_book': b"pdf"}
+    inquiries = archive.find_inquiries(live, email="b@x.com")
+    assert [(row['id'], row['archive']) for row in inquiries] == [(2, "archive_2022.db")]
+    assert [row['id'] for row in archive.find_inquiries(live, car_id=1)] == [1]
+
+    # Nothing left to move
+    assert archive.run(live, now=NOW) == (0, 0)
+
+
+def test_live_schema_changes_do_not_break_later_passes(live):
+    archive.run(live, now=NOW)
+    conn = live()
+    conn.execute("ALTER TABLE cars ADD COLUMN colour TEXT")
+    conn.execute("INSERT INTO cars (id, seller_id, maker, status, created_at, colour) "
+                 "VALUES (4, 7, 'Kia', 'rejected', '2023-01-01 10:00:00', 'red')")
+    conn.commit()
+    conn.close()
+    assert archive.run(live, now=NOW) == (1, 0)
+    cars = {car['id']: car for car in archive.find_cars(live, seller_ids=[7])}
+    assert sorted(cars) == [1, 4]
+    assert cars[4]['colour'] == 'red'
+    assert cars[1]['colour'] is None
+
+
+def test_failed_pass_leaves_both_files_unchanged(live, monkeypatch):
+    real_move = archive._move
+
+    def failing_move(conn, year, car_ids, inquiry_ids, directory):
+        # Break the delete half of the transaction after the copy
+        conn.execute("CREATE TEMP TRIGGER fail BEFORE DELETE ON main.cars BEGIN SELECT RAISE(ABORT, 'boom'); END")
+        try:
+            real_move(conn, year, car_ids, inquiry_ids, directory)
+        finally:
+            conn.execute("DROP TRIGGER temp.fail")
+
+    monkeypatch.setattr(archive, "_move", failing_move)
+    with pytest.raises(sqlite3.IntegrityError):
+        archive.run(live, now=NOW)
+    assert ids(live, "cars") == [1, 2, 3]
+    assert ids(live, "car_images") == [1]
+    assert archive.find_cars(live, car_id=1) == []
+    # Each year is its own transaction: 2022 committed before 2023 failed
+    assert ids(live, "buyer_inquiries") == [1, 3]
@@ -0,0 +1,82 @@
+import logging
+
+import pytest
+
+from carzone.utils.catalog import build_catalog
+
+MODELS = {'Tata': ['Nexon', 'Punch'], 'Maruti': ['Swift']}
+LOCATIONS = {'Kerala': ['Kochi', 'Kollam'], 'Delhi': ['New Delhi']}
+
+
+def make_catalog(car_makes=None, estimate_locations=None):
+    return build_catalog(
+        MODELS, LOCATIONS, MODELS.__getitem__, LOCATIONS.__getitem__,
+        ['Petrol', 'Diesel'], ['Manual', 'Automatic'], ['First', 'Second'], ['Base', 'Top'],
+        ['Sunroof', 'ABS'],
+        car_makes=car_makes, estimate_locations=estimate_locations,
+    )
+
+
+def test_lookups():
+    catalog = make_catalog()
+    assert catalog.makers == ('Tata', 'Maruti')
+    assert catalog.models_for('Tata') == ('Nexon', 'Punch')
+    assert catalog.models_for('Kia') == ()
+    assert catalog.is_valid_model('Maruti', 'Swift')
+    assert not catalog.is_valid_model('Maruti', 'Nexon')
+    assert catalog.is_valid_city('Kerala', 'Kochi')
+    assert not catalog.is_valid_city('Delhi', 'Kochi')
+    assert catalog.states_by_city['Kochi'] == ('Kerala',)
+    with pytest.raises(TypeError):
+        catalog.model_ids[('Kia', 'Seltos')] = 99
+
+
+def test_estimate_options_are_the_overlap(caplog):
+    with caplog.at_level(logging.WARNING, logger="carzone.utils.catalog"):
+        catalog = make_catalog(
+            car_makes={'Tata': {'Nexon': 8.0, 'Harrier': 15.0}, 'Kia': {'Seltos': 11.0}},
+            estimate_locations={'Kerala': {'cities': ['Kochi']}, 'Goa': {'cities': ['Panaji']}},
+        )
+    assert catalog.has_estimates
+    assert catalog.estimate_makers == ('Tata',)
+    assert catalog.estimate_models_by_maker == {'Tata': ('Nexon',)}
+    assert catalog.estimate_states == ('Kerala',)
+    assert catalog.estimate_cities_by_state == {'Kerala': ('Kochi',)}
+    assert catalog.base_price('Tata', 'Nexon') == 800000
+    assert catalog.unlisted_priced_models == (('Tata', 'Harrier'), ('Kia', 'Seltos'))
+    assert "Tata Harrier" in caplog.text and "Kia Seltos" in caplog.text
+
+
+def test_empty_estimate_overlap_is_reported(caplog):
+    with caplog.at_level(logging.ERROR, logger="carzone.utils.catalog"):
+        catalog = make_catalog(car_makes={'Kia': {'Seltos': 11.0}})
+    assert not catalog.has_estimates
+    assert catalog.estimate_makers == ()
+    assert "Estimate has nothing to offer" in caplog.text
+    # Locations are still offered, but without a priced model nothing can be estimated
+    assert catalog.estimate_states == ('Kerala', 'Delhi')
+
+
+def test_validate_accepts_a_listable_car():
+    catalog = make_catalog()
+    car = {
+        'maker': 'Tata', 'model': 'Nexon', 'state': 'Kerala', 'city': 'Kochi',
+        'fuel_type': 'Petrol', 'transmission': 'Manual', 'ownership': 'First', 'variant': 'Top',
+        'extra_features': 'Sunroof, ABS',
+    }
+    assert catalog.validate(car) == []
+    assert catalog.validate(dict(car, extra_features=['ABS'])) == []
+
+
+def test_validate_reports_every_problem():
+    catalog = make_catalog()
+    errors = catalog.validate({
+        'maker': 'Maruti', 'model': 'Nexon', 'state': 'Delhi', 'city': 'Kochi',
+        'fuel_type': 'Hydrogen', 'extra_features': ['ABS', 'Jetpack'],
+    })
+    assert errors == [
+        "Unknown car model: Maruti Nexon",
+        "Unknown location: Kochi, Delhi",
+        "Unknown fuel type: Hydrogen",
+        "Unknown extra features: Jetpack",
+    ]
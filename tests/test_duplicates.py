@@ -0,0 +1,129 @@
+import io
+import random
+import sqlite3
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from carzone.utils import duplicates
+from carzone.utils.duplicates import BKTree
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def test_bk_tree_matches_brute_force():
+    rng = random.Random(3)
+    # Clusters of near-identical hashes, as re-encoded photos produce
+    bases = [rng.getrandbits(64) for _ in range(40)]
+    values = []
+    for car_id in range(400):
+        value = rng.choice(bases)
+        for _ in range(rng.randrange(8)):
+            value ^= 1 << rng.randrange(64)
+        values.append((value, car_id))
+    tree = BKTree()
+    for value, car_id in values:
+        tree.add(value, car_id)
+    for _ in range(100):
+        query = rng.choice(bases) ^ (1 << rng.randrange(64))
+        for max_distance in (0, 4, 10):
+            expected = {}
+            for value, car_id in values:
+                distance = hamming(value, query)
+                if distance <= max_distance:
+                    expected[car_id] = min(distance, expected.get(car_id, 64))
+            assert tree.search(query, max_distance) == expected
+
+
+def test_empty_bk_tree():
+    assert BKTree().search(0, 10) == {}
+
+
+def photo(shade=0, size=64, fmt="PNG"):
+    image = Image.new("L", (size, size))
+    image.putdata([(x * 4 + y + shade) % 256 for y in range(size) for x in range(size)])
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(duplicates, "_tree", None)
+    path = str(tmp_path / "cars.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cars (id INTEGER PRIMARY KEY, status TEXT)")
+    conn.execute("CREATE TABLE car_images (id INTEGER PRIMARY KEY, car_id INTEGER, image_data BLOB)")
+    conn.executemany("INSERT INTO cars VALUES (?, 'pending')", [(1,), (2,), (3,)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def connector(path, timeout=5.0):
+    return lambda: sqlite3.connect(path, timeout=timeout)
+
+
+def test_check_image_flags_reencoded_copy(db_path):
+    get_connection = connector(db_path)
+    assert duplicates.check_image(get_connection, 1, photo()) == {}
+    # Same car, same photo: not reported
+    assert duplicates.check_image(get_connection, 1, photo()) == {}
+    matches = duplicates.check_image(get_connection, 2, photo(fmt="JPEG"))
+    assert list(matches) == [1]
+    conn = get_connection()
+    flags = duplicates.flags_for(conn.cursor(), [2])
+    conn.close()
+    assert [(matched, status) for matched, _, status in flags[2]] == [(1, 'pending')]
+
+
+def test_check_image_syncs_rows_from_other_workers(db_path):
+    get_connection = connector(db_path)
+    duplicates.check_image(get_connection, 1, photo())
+    conn = get_connection()
+    conn.execute("INSERT INTO image_hashes (car_id, hash) VALUES (3, 12345)")
+    conn.commit()
+    conn.close()
+    duplicates.check_image(get_connection, 2, photo(shade=128))
+    assert duplicates._tree.last_id == 3
+    assert duplicates._tree.search(12345, 0) == {3: 0}
+
+
+def test_undecodable_images_are_skipped(db_path, monkeypatch):
+    get_connection = connector(db_path)
+    assert duplicates.check_image(get_connection, 1, b"not an image") == {}
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 10)
+    assert duplicates.check_image(get_connection, 1, photo()) == {}
+
+
+def test_locked_database_does_not_fail_the_upload(db_path):
+    duplicates.check_image(connector(db_path), 1, photo())
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        assert duplicates.check_image(connector(db_path, timeout=0.05), 2, photo()) == {}
+    finally:
+        blocker.rollback()
+        blocker.close()
+
+
+def test_backfill_hashes_missing_images(db_path):
+    get_connection = connector(db_path)
+    conn = get_connection()
+    conn.executemany(
+        "INSERT INTO car_images (car_id, image_data) VALUES (?, ?)",
+        [(1, photo()), (1, photo(shade=128)), (2, photo(fmt="JPEG"))]
+    )
+    conn.commit()
+    conn.close()
+    # Car 1's first photo was checked at upload; the second was skipped
+    duplicates.check_image(get_connection, 1, photo())
+    assert duplicates.backfill(get_connection) == 2
+    assert duplicates.backfill(get_connection) == 0
+    conn = get_connection()
+    assert conn.execute("SELECT car_id, COUNT(*) FROM image_hashes GROUP BY car_id").fetchall() == [(1, 2), (2, 1)]
+    assert conn.execute("SELECT car_id, matched_car_id FROM duplicate_flags").fetchall() == [(2, 1)]
+    conn.close()
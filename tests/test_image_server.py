@@ -0,0 +1,117 @@
+import http.client
+import sqlite3
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from carzone.utils import image_server
+from carzone.utils.image_server import _byte_range
+
+
+@pytest.mark.parametrize("header, length, expected", [
+    ("bytes=0-9", 100, (0, 9)),
+    ("bytes=90-", 100, (90, 99)),
+    ("bytes=-10", 100, (90, 99)),
+    ("bytes=-500", 100, (0, 99)),
+    ("bytes=50-500", 100, (50, 99)),
+    (" bytes=0-0 ", 100, (0, 0)),
+    ("bytes=100-", 100, "unsatisfiable"),
+    ("bytes=20-10", 100, "unsatisfiable"),
+    ("bytes=-", 100, None),
+    ("bytes=0-9,20-29", 100, None),
+    ("items=0-9", 100, None),
+])
+def test_byte_range(header, length, expected):
+    assert _byte_range(header, length) == expected
+
+
+BODY = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "live.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE cars (id INTEGER PRIMARY KEY, status TEXT);
+        CREATE TABLE car_images (id INTEGER PRIMARY KEY, car_id INTEGER, image_data BLOB);
+        INSERT INTO cars VALUES (1, 'approved'), (2, NULL);
+    """)
+    conn.execute("INSERT INTO car_images VALUES (1, 1, ?), (2, 2, ?)", (BODY, BODY))
+    conn.commit()
+    conn.close()
+    image_server._cache = image_server._ByteLRU(1024 * 1024)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), image_server._make_handler(lambda: sqlite3.connect(path)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+
+
+def request(port, path, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, body
+
+
+def test_full_response_and_conditional_get(server):
+    response, body = request(server, "/images/1")
+    assert response.status == 200
+    assert body == BODY
+    etag = response.getheader("ETag")
+    response, body = request(server, "/images/1", {"If-None-Match": etag})
+    assert response.status == 304
+    assert body == b""
+
+
+def test_range_and_if_range(server):
+    etag = request(server, "/images/1")[0].getheader("ETag")
+    response, body = request(server, "/images/1", {"Range": "bytes=10-19"})
+    assert response.status == 206
+    assert body == BODY[10:20]
+    assert response.getheader("Content-Range") == f"bytes 10-19/{len(BODY)}"
+    # Matching validator: the range applies
+    response, body = request(server, "/images/1", {"Range": "bytes=10-19", "If-Range": etag})
+    assert response.status == 206
+    assert body == BODY[10:20]
+    # Stale validator: the whole current body is sent instead
+    response, body = request(server, "/images/1", {"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert response.status == 200
+    assert body == BODY
+    response, _ = request(server, "/images/1", {"Range": f"bytes={len(BODY)}-"})
+    assert response.status == 416
+    assert response.getheader("Content-Range") == f"bytes */{len(BODY)}"
+
+
+def test_unapproved_images_need_a_signature(server):
+    assert request(server, "/images/2")[0].status == 404
+    assert request(server, "/images/2?sig=bogus")[0].status == 404
+    response, body = request(server, f"/images/2?sig={image_server.sign(2)}")
+    assert response.status == 200
+    assert body == BODY
+
+
+def test_bad_width_is_rejected(server):
+    assert request(server, "/images/1?w=123")[0].status == 400
+
+
+def test_warm_fills_the_inline_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "live.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE cars (id INTEGER PRIMARY KEY, status TEXT);
+        CREATE TABLE car_images (id INTEGER PRIMARY KEY, car_id INTEGER, image_data BLOB);
+        INSERT INTO cars VALUES (2, 'pending');
+    """)
+    conn.execute("INSERT INTO car_images VALUES (5, 2, ?)", (BODY,))
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(image_server, "_cache", image_server._ByteLRU(1024 * 1024))
+    image_server.warm(lambda: sqlite3.connect(path), [5], width=640, signed=True).join(5)
+    assert image_server._cache.get((5, 640, True))[1] == BODY
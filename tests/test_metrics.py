@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from carzone.utils import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_totals", {})
+    monkeypatch.setattr(metrics, "_last_prom_write", float("inf"))
+
+
+def test_prometheus_families_are_contiguous(enabled):
+    metrics._record("sql.fetch", 0.1, rows=2, nbytes=30)
+    metrics._record("page.Buy", 0.2)
+    families = []
+    for line in metrics.prometheus_text().splitlines():
+        if line.startswith("# HELP"):
+            families.append(line.split()[2])
+            continue
+        if line.startswith("#"):
+            continue
+        # Every sample belongs to the family announced just before it
+        assert line.split("{")[0].split()[0] == families[-1]
+    assert len(families) == len(set(families))
+
+
+def test_interrupted_rerun_is_recorded(enabled):
+    rerun = metrics.start_rerun()
+    with pytest.raises(RuntimeError):
+        try:
+            raise RuntimeError("st.stop()")
+        finally:
+            metrics.finish_rerun(rerun, "Buy")
+    assert metrics.snapshot()[0]["page.Buy"]["calls"] == 1
+
+
+def test_timed_connection_records_queries(enabled):
+    def connect():
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    conn = metrics.wrap_connection_factory(connect)()
+    rows = conn.execute("SELECT 1 AS one UNION ALL SELECT 2").fetchall()
+    assert [row["one"] for row in rows] == [1, 2]
+    totals = metrics.snapshot()[0]
+    assert totals["sql.execute"]["calls"] == 1
+    assert totals["sql.fetch"]["rows"] == 2
@@ -0,0 +1,169 @@
+from carzone.utils.otp_store import OTPStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def deliver(email):
+    return True, "OTP sent"
+
+
+def make_check(valid="123456"):
+    calls = []
+
+    def check(email, otp):
+        calls.append((email, otp))
+        return (otp == valid), ("Verified" if otp == valid else "Invalid OTP")
+
+    check.calls = calls
+    return check
+
+
+def make_store(**kwargs):
+    clock = FakeClock()
+    options = dict(ttl=60, max_attempts=3, lockout=300, clock=clock)
+    options.update(kwargs)
+    return OTPStore(**options), clock
+
+
+def test_verify_within_ttl_succeeds_once():
+    store, clock = make_store()
+    check = make_check()
+    assert store.send("a@x.com", deliver)[0]
+    clock.now += 59
+    assert store.verify("A@x.com ", "123456", check)[0]
+    # The record is consumed on success
+    assert not store.verify("a@x.com", "123456", check)[0]
+    assert len(check.calls) == 1
+
+
+def test_expired_otp_is_rejected_without_calling_check():
+    store, clock = make_store()
+    check = make_check()
+    store.send("a@x.com", deliver)
+    clock.now += 60
+    success, message = store.verify("a@x.com", "123456", check)
+    assert not success
+    assert "expired" in message
+    assert check.calls == []
+
+
+def test_unrequested_email_is_rejected():
+    store, _ = make_store()
+    check = make_check()
+    assert not store.verify("nobody@x.com", "123456", check)[0]
+    assert check.calls == []
+
+
+def test_failed_delivery_creates_no_record():
+    store, _ = make_store()
+    assert store.send("a@x.com", lambda email: (False, "SMTP down")) == (False, "SMTP down")
+    assert len(store) == 0
+
+
+def test_attempts_exhausted_locks_out():
+    store, clock = make_store()
+    check = make_check()
+    store.send("a@x.com", deliver)
+    for _ in range(3):
+        assert not store.verify("a@x.com", "000000", check)[0]
+    assert len(check.calls) == 3
+    # Locked: the correct code is refused without reaching the sender
+    success, message = store.verify("a@x.com", "123456", check)
+    assert not success
+    assert "Too many incorrect attempts" in message
+    assert len(check.calls) == 3
+    assert not store.send("a@x.com", deliver)[0]
+
+
+def test_lockout_expires():
+    store, clock = make_store()
+    check = make_check()
+    store.send("a@x.com", deliver)
+    for _ in range(3):
+        store.verify("a@x.com", "000000", check)
+    clock.now += 301
+    assert store.send("a@x.com", deliver)[0]
+    assert store.verify("a@x.com", "123456", check)[0]
+
+
+def test_resend_keeps_failed_attempts():
+    store, clock = make_store()
+    check = make_check()
+    store.send("a@x.com", deliver)
+    store.verify("a@x.com", "000000", check)
+    store.verify("a@x.com", "000000", check)
+    store.send("a@x.com", deliver)
+    assert not store.verify("a@x.com", "000000", check)[0]
+    # Third failure across both codes locks the email
+    success, message = store.verify("a@x.com", "123456", check)
+    assert not success
+    assert "Too many incorrect attempts" in message
+
+
+def test_guess_resend_cycles_hit_the_lockout():
+    store, clock = make_store(max_sends=1000)
+    check = make_check()
+    # Two guesses per code, then a resend, as a client dodging the lockout would
+    for _ in range(100):
+        if not store.send("a@x.com", deliver)[0]:
+            break
+        for _ in range(2):
+            store.verify("a@x.com", "000000", check)
+        clock.now += 1
+    assert len(check.calls) == 3
+    assert not store.send("a@x.com", deliver)[0]
+
+
+def test_sends_are_rate_limited():
+    store, clock = make_store(max_sends=3)
+    for _ in range(3):
+        assert store.send("a@x.com", deliver)[0]
+    success, message = store.send("A@x.com", deliver)
+    assert not success
+    assert "Too many OTP requests" in message
+    # A new window (the lockout period) allows sending again
+    clock.now += 301
+    assert store.send("a@x.com", deliver)[0]
+
+
+def test_failures_age_out_after_the_window():
+    store, clock = make_store()
+    check = make_check()
+    store.send("a@x.com", deliver)
+    store.verify("a@x.com", "000000", check)
+    store.verify("a@x.com", "000000", check)
+    clock.now += 301
+    store.send("a@x.com", deliver)
+    store.verify("a@x.com", "000000", check)
+    store.verify("a@x.com", "000000", check)
+    assert store.verify("a@x.com", "123456", check)[0]
+
+
+def test_sweep_drops_expired_records():
+    store, clock = make_store()
+    for i in range(10):
+        store.send(f"user{i}@x.com", deliver)
+    # Records outlive the code until their counting window ends
+    clock.now += 61
+    store.sweep()
+    assert len(store) == 10
+    clock.now += 240
+    store.sweep()
+    assert len(store) == 0
+
+
+def test_max_entries_evicts_soonest_expiring():
+    store, clock = make_store(max_entries=3)
+    for i in range(5):
+        store.send(f"user{i}@x.com", deliver)
+        clock.now += 1
+    assert len(store) == 3
+    check = make_check()
+    assert not store.verify("user0@x.com", "123456", check)[0]
+    assert store.verify("user4@x.com", "123456", check)[0]
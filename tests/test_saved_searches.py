@@ -0,0 +1,153 @@
+import random
+import sqlite3
+
+import pytest
+
+from carzone.utils import saved_searches
+from carzone.utils.saved_searches import EQ_ATTRIBUTES, IntervalTree, SearchIndex, _price_range
+
+VALUES = {
+    'maker': ['Maruti', 'Hyundai', 'Tata'],
+    'model': ['Swift', 'i20', 'Nexon'],
+    'fuel_type': ['Petrol', 'Diesel'],
+    'transmission': ['Manual', 'Automatic'],
+    'state': ['Delhi', 'Kerala'],
+    'city': ['New Delhi', 'Kochi'],
+}
+
+
+def random_filters(rng):
+    filters = {
+        attribute: rng.choice(values) if rng.random() < 0.3 else None
+        for attribute, values in VALUES.items()
+    }
+    # Inverted ranges (min > max) are possible from the Buy page inputs
+    filters['min_price'] = rng.choice([None, 0, 100000, 300000, 500000, 800000])
+    filters['max_price'] = rng.choice([None, 200000, 500000, 900000, 10000000])
+    return filters
+
+
+def random_car(rng):
+    car = {attribute: rng.choice(values) for attribute, values in VALUES.items()}
+    car['price'] = rng.choice([0, 100000, 250000, 500000, 750000, 900000, 2000000])
+    return car
+
+
+def brute_force(searches, car):
+    matched = set()
+    for search_id, filters in searches.items():
+        if any(filters.get(attribute) and filters[attribute] != car[attribute] for attribute in EQ_ATTRIBUTES):
+            continue
+        low, high = _price_range(filters)
+        if low <= float(car['price'] or 0) <= high:
+            matched.add(search_id)
+    return matched
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(7)
+    tree = IntervalTree()
+    intervals = {}
+    for key in range(300):
+        low = rng.choice([float('-inf')] + list(range(0, 100, 5)))
+        high = rng.choice([float('inf')] + list(range(0, 100, 5)))
+        if low <= high:
+            tree.add(key, low, high)
+            intervals[key] = (low, high)
+    for key in rng.sample(sorted(intervals), 50):
+        tree.discard(key)
+        del intervals[key]
+    for point in [-1, 0, 2.5, 5, 50, 99, 100, 1000]:
+        expected = {key for key, (low, high) in intervals.items() if low <= point <= high}
+        assert sorted(tree.stab(point)) == sorted(expected)
+
+
+def test_empty_interval_tree():
+    assert IntervalTree().stab(10) == []
+
+
+def test_search_index_matches_brute_force():
+    rng = random.Random(11)
+    index = SearchIndex()
+    searches = {}
+    for search_id in range(1, 401):
+        filters = random_filters(rng)
+        index.add(search_id, filters)
+        searches[search_id] = filters
+    for search_id in rng.sample(sorted(searches), 100):
+        index.remove(search_id)
+        del searches[search_id]
+    assert len(index) == len(searches)
+    for _ in range(200):
+        car = random_car(rng)
+        assert index.match(car) == brute_force(searches, car)
+
+
+def test_adding_does_not_advance_last_id():
+    # Only _load_new moves last_id, so rows another worker inserted below a
+    # locally saved id are still picked up on the next sync
+    index = SearchIndex()
+    index.add(5, {'maker': 'Tata'})
+    assert index.last_id == 0
+
+
+@pytest.fixture
+def get_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(saved_searches, "_index", None)
+    monkeypatch.setattr(saved_searches, "_tables_ready", False)
+    path = str(tmp_path / "cars.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE cars (id INTEGER PRIMARY KEY, maker TEXT, model TEXT, year INTEGER, fuel_type TEXT, "
+        "transmission TEXT, state TEXT, city TEXT, price INTEGER, status TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO cars VALUES (?, ?, ?, 2020, 'Petrol', 'Manual', 'Kerala', 'Kochi', ?, ?)",
+        [(1, 'Tata', 'Nexon', 700000, 'approved'),
+         (2, 'Maruti', 'Swift', 400000, 'approved'),
+         (3, 'Tata', 'Nexon', 650000, 'pending')]
+    )
+    conn.commit()
+    conn.close()
+    return lambda: sqlite3.connect(path)
+
+
+def test_save_notify_and_manage(get_connection):
+    saved_searches.save(get_connection, " Buyer@Example.com ", {'maker': 'Tata', 'max_price': 800000})
+    saved_searches.save(get_connection, "buyer@example.com", {'min_price': 500000})
+    saved_searches.save(get_connection, "other@example.com", {'maker': 'Maruti'})
+
+    # Pending cars are not matched
+    assert saved_searches.notify_matches(get_connection, [1, 2, 3]) == 3
+
+    unseen = saved_searches.unseen_matches(get_connection, "buyer@example.com")
+    assert [row[0] for row in unseen] == [1]
+    listed = saved_searches.list_for(get_connection, "BUYER@example.com")
+    assert [(filters, count) for _, filters, count in listed] == [
+        ({'maker': 'Tata', 'max_price': 800000}, 1),
+        ({'min_price': 500000}, 1),
+    ]
+
+    saved_searches.mark_seen(get_connection, "buyer@example.com")
+    assert saved_searches.unseen_matches(get_connection, "buyer@example.com") == []
+    assert saved_searches.unseen_matches(get_connection, "other@example.com")[0][0] == 2
+
+    # Another user's email cannot delete the search
+    search_id = listed[0][0]
+    saved_searches.delete(get_connection, "other@example.com", search_id)
+    assert len(saved_searches.list_for(get_connection, "buyer@example.com")) == 2
+    saved_searches.delete(get_connection, "buyer@example.com", search_id)
+    assert len(saved_searches.list_for(get_connection, "buyer@example.com")) == 1
+
+
+def test_save_picks_up_searches_from_other_workers(get_connection):
+    saved_searches.save(get_connection, "buyer@example.com", {'maker': 'Tata'})
+    conn = get_connection()
+    conn.execute(
+        "INSERT INTO saved_searches (email, filters) VALUES ('other@example.com', '{\"maker\": \"Maruti\"}')"
+    )
+    conn.commit()
+    conn.close()
+    saved_searches.save(get_connection, "buyer@example.com", {'min_price': 500000})
+    assert len(saved_searches._index) == 3
+    assert saved_searches._index.last_id == 3
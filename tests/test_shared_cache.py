@@ -0,0 +1,104 @@
+import pickle
+import sqlite3
+
+import pytest
+
+from carzone.utils import shared_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "ENABLED", True)
+    monkeypatch.setattr(shared_cache, "_path", None)
+    monkeypatch.delenv("TECHCAR_SHARED_CACHE_PATH", raising=False)
+    path = str(tmp_path / "cars.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cars (id INTEGER PRIMARY KEY, status TEXT, price INTEGER)")
+    # Installed by earlier versions; fired on every change to cars
+    conn.execute("""
+        CREATE TRIGGER cars_generation_insert AFTER INSERT ON cars BEGIN
+            UPDATE cache_generation SET generation = generation + 1;
+        END
+    """)
+    conn.commit()
+    conn.close()
+    shared_cache.install(lambda: sqlite3.connect(path))
+    return shared_cache.cache_path(path)
+
+
+@pytest.fixture
+def live(cache):
+    return sqlite3.connect(cache[:-len(".cache.db")])
+
+
+def test_round_trip(cache):
+    listings = [{'id': 1, 'maker': 'Tata', 'price': 700000.0, 'image_ids': [3, 4], 'notes': None}]
+    image = ('"abc"', b'\x89PNG', 'image/png')
+    shared_cache.put("listings", ("q", (1,)), listings, generation=2)
+    shared_cache.put("image", (3, 640), image)
+    assert shared_cache.get("listings", ("q", (1,)), generation=2) == listings
+    assert shared_cache.get("listings", ("q", (1,)), generation=3) is shared_cache.MISS
+    assert shared_cache.get("image", (3, 640)) == image
+
+
+def test_unstorable_values_are_skipped(cache):
+    shared_cache.put("estimate", "key", object())
+    assert shared_cache.get("estimate", "key") is shared_cache.MISS
+
+
+class Exploit:
+    ran = False
+
+    def __reduce__(self):
+        return (setattr, (Exploit, "ran", True))
+
+
+@pytest.mark.parametrize("payload", [b"garbage", pickle.dumps(Exploit())])
+def test_undecodable_entry_is_a_miss(cache, payload):
+    shared_cache.put("estimate", "key", 1.5)
+    conn = sqlite3.connect(cache)
+    conn.execute("UPDATE entries SET value = ?", (payload,))
+    conn.commit()
+    conn.close()
+    assert shared_cache.get("estimate", "key") is shared_cache.MISS
+    assert not Exploit.ran
+    conn = sqlite3.connect(cache)
+    assert conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0
+    conn.close()
+
+
+def generation(conn):
+    return conn.execute("SELECT generation FROM cache_generation").fetchone()[0]
+
+
+def test_only_approved_cars_bump_the_generation(live):
+    start = generation(live)
+    # Pending Sell submissions and their edits are not on the Buy page
+    live.execute("INSERT INTO cars VALUES (1, 'pending', 500000)")
+    live.execute("UPDATE cars SET price = 450000 WHERE id = 1")
+    live.commit()
+    assert generation(live) == start
+    live.execute("UPDATE cars SET status = 'approved' WHERE id = 1")
+    live.commit()
+    assert generation(live) == start + 1
+    live.execute("UPDATE cars SET price = 400000 WHERE id = 1")
+    live.execute("UPDATE cars SET status = 'rejected' WHERE id = 1")
+    live.execute("DELETE FROM cars WHERE id = 1")
+    live.commit()
+    assert generation(live) == start + 3
+    live.execute("INSERT INTO cars VALUES (2, 'approved', 1)")
+    live.execute("DELETE FROM cars WHERE id = 2")
+    live.commit()
+    assert generation(live) == start + 5
+
+
+def test_entries_from_newer_snapshots_survive_older_readers(cache):
+    shared_cache.put("listings", "q", ["new"], generation=5)
+    # A worker on an older snapshot neither deletes nor overwrites it
+    assert shared_cache.get("listings", "q", generation=4) is shared_cache.MISS
+    shared_cache.put("listings", "q", ["old"], generation=4)
+    assert shared_cache.get("listings", "q", generation=5) == ["new"]
+    # A newer reader replaces the stale entry
+    assert shared_cache.get("listings", "q", generation=6) is shared_cache.MISS
+    shared_cache.put("listings", "q", ["newest"], generation=6)
+    assert shared_cache.get("listings", "q", generation=6) == ["newest"]